@@ -81,6 +81,22 @@ def toSamples(fr, ar, fps):
     return int(fr * ar / fps)
 
 
+def probeChannels(paths):
+    '''Returns the number of audio channels of each source, read from the
+    ffprobe cache of velvet_revolver when that addon is enabled'''
+    preferences = bpy.context.preferences
+    if 'velvet_revolver' not in preferences.addons:
+        return {}
+
+    import velvet_revolver
+    ffCommand = preferences.addons['blue_velvet'].preferences.ffCommand
+    ffprobe = velvet_revolver.ffprobeCommand(ffCommand)
+    paths = [p for p in set(paths) if os.path.isfile(p)]
+    metadata = velvet_revolver.getProbeCache().probe(ffprobe, paths)
+
+    return {p: meta['a_channels'] for p, meta in metadata.items()}
+
+
 def getAudioTimeline(ar, fps):
     '''Retrieves all relevant audio information from scene's timeline'''
     timelineSources = []
@@ -91,6 +107,9 @@ def getAudioTimeline(ar, fps):
     path = bpy.path
     validExts = list(path.extensions_audio) + list(path.extensions_movie)
 
+    channels = probeChannels([path.abspath(i.sound.filepath)
+                              for i in bpy.context.sequences if i.type == "SOUND"])
+
     for i in bpy.context.sequences:
         # Movies with audio such as MOV (h264 + mp3) are read by Blender as:
         # movie_strip.mov (type=='SOUND') and movie_strip.001 (type=='VIDEO').
@@ -146,7 +165,9 @@ def getAudioTimeline(ar, fps):
             # Blender's list of sources. This would cause an error when
             # running the script. Files not in data.sounds will be considered
             # as stereo here, but they will not be processed later.
-            if (name in bpy.data.sounds) and (bpy.data.sounds[name].use_mono):
+            # Sources that ffprobe found to be mono are kept mono as well.
+            mono = (name in bpy.data.sounds) and (bpy.data.sounds[name].use_mono)
+            if mono or channels.get(path.abspath(i.sound.filepath)) == 1:
                 audioData['channels'] = 0
             else:
                 audioData['channels'] = 1
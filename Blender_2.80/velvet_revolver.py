@@ -31,10 +31,20 @@ bl_info = {
 
 import bpy
 import os
-import glob
+import sys
+import json
+import mmap
+import time
+import queue
+import hashlib
 import os.path
+import fnmatch
+import tempfile
+import threading
 from bpy.types import Operator
-from subprocess import call
+from bpy.app.handlers import persistent
+from subprocess import check_output, CalledProcessError, Popen, PIPE
+from concurrent.futures import ThreadPoolExecutor
 from shutil import which
 from bpy_extras.io_utils import ExportHelper
 from bpy.props import StringProperty, EnumProperty, IntProperty, FloatProperty, BoolProperty
@@ -44,13 +54,117 @@ from bpy.props import StringProperty, EnumProperty, IntProperty, FloatProperty,
 ######## ----------------------------------------------------------------------
 
 
+# Strips each toggle works on
+toggle_scopes = (
+    ('ALL', "All Strips", "Every strip in the scene"),
+    ('SELECTED', "Selected Strips", "Only the selected strips"),
+    ('PREVIEW', "Preview Range", "Strips inside the preview range (the scene range if there is none)"),
+    ('CHANNELS', "Channels", "Strips in the listed channels"),
+)
+
+
+# Proxy ladder rungs the toggles can switch to
+rung_items = (
+    ('100', "Full Proxy", "Proxies at the size they were encoded"),
+    ('50', "Half Proxy", "Proxies at 50% of that size"),
+    ('25', "Quarter Proxy", "Proxies at 25% of that size, for scrubbing"),
+)
+
+
+def parseChannels(channels):
+    '''Turns "1, 3-5" into {1, 3, 4, 5}'''
+    numbers = set()
+    for part in channels.replace(" ", "").split(","):
+        try:
+            if "-" in part:
+                first, last = part.split("-", 1)
+                numbers.update(range(int(first), int(last) + 1))
+            elif part:
+                numbers.add(int(part))
+        except ValueError:
+            print("Channel '" + part + "' is not a number or a range.")
+    return numbers
+
+
+def scopedStrips(scene, scope, channels=""):
+    '''Returns the strips of scene inside scope, one of toggle_scopes'''
+    if not scene.sequence_editor:
+        return []
+    strips = scene.sequence_editor.sequences_all
+
+    if scope == 'SELECTED':
+        return [s for s in strips if s.select]
+    elif scope == 'PREVIEW':
+        if scene.use_preview_range:
+            start, end = scene.frame_preview_start, scene.frame_preview_end
+        else:
+            start, end = scene.frame_start, scene.frame_end
+        return [s for s in strips
+                if s.frame_final_start <= end and s.frame_final_end > start]
+    elif scope == 'CHANNELS':
+        numbers = parseChannels(channels)
+        return [s for s in strips if s.channel in numbers]
+    return list(strips)
+
+
+def stripFilepath(s):
+    '''Returns the absolute path of the file of a MOVIE or SOUND strip'''
+    # From Blender 2.77 onwards, sound files filepath have to
+    # be referred to as s.sound.filepath instead of s.filepath
+    if s.type == "SOUND":
+        f_path, library = s.sound.filepath, s.sound.library
+    else:
+        f_path, library = s.filepath, s.id_data.library
+    return os.path.normpath(bpy.path.abspath(f_path, library=library))
+
+
+def keepPathForm(old_path, new_path):
+    '''Returns new_path relative to the .blend file if old_path was'''
+    if old_path.startswith("//") and bpy.data.filepath:
+        try:
+            return bpy.path.relpath(new_path)
+        except ValueError:
+            # Windows: file on another drive than the .blend
+            pass
+    return new_path
+
+
+def setStripFilepath(s, f_path):
+    '''Points a strip to f_path, keeping its path relative if it was'''
+    if s.type == "SOUND":
+        f_path = keepPathForm(s.sound.filepath, f_path)
+    else:
+        f_path = keepPathForm(s.filepath, f_path)
+
+    if s.type == "SOUND":
+        s.sound.filepath = f_path
+    else:
+        s.filepath = f_path
+
+
 class Proxy_Editing_ToProxy(bpy.types.Operator):
-    """Change filepaths of current strips to proxy files (_proxy.mov)"""
+    """Change filepaths of current strips to proxy files (_proxy.mov, or a rung of the proxy ladder)"""
     bl_idname = "sequencer.proxy_editing_toproxy"
     bl_label = "Proxy Editing - Change to Proxies"
     bl_options = {'REGISTER', 'UNDO'}
     # Shortcuts: Ctrl + Alt + Shift + P
 
+    prop_rung: EnumProperty(
+        name="Proxy Size",
+        default='100',
+        items=rung_items,
+    )
+    prop_scope: EnumProperty(
+        name="Strips",
+        default='ALL',
+        items=toggle_scopes,
+    )
+    prop_channels: StringProperty(
+        name="Channels",
+        description="Channels to toggle, as in 1, 3-5",
+        default="",
+    )
+
     @classmethod
     def poll(cls, context):
         if bpy.context.sequences:
@@ -58,101 +172,65 @@ class Proxy_Editing_ToProxy(bpy.types.Operator):
 
     def execute(self, context):
 
-        # Making strips' paths absolute is necessary for script's execution.
-        bpy.ops.file.make_paths_absolute()
+        # Only the strips that change are rewritten, each one keeping its
+        # path relative or absolute
 
-        def checkProxyFile(f_path, ref):
-            ''' Checks for (and returns) correspondent proxy file that may or
-            may not have the same extension as the original full_res file '''
-            base_path, ext = os.path.splitext(f_path)
-            proxy_file = base_path[:ref] + "_proxy" + ext
-            # ...and the proxy file has same extension as the fullres
-            if os.path.isfile(proxy_file):
-                return proxy_file
-            # ...or the proxy file has different extension than fullres
-            else:
-                for e in bpy.path.extensions_movie:
-                    proxy_file = base_path[:ref] + "_proxy" + e
-                    if os.path.isfile(proxy_file):
-                        return proxy_file
+        # Each folder involved is listed once; every strip is then a lookup
+        index = getMediaIndex()
+        rung = int(self.prop_rung)
+
+        # Files the toggled strips play now
+        switched = []
 
         #for s in bpy.context.sequences:
         scene = bpy.context.scene
-        for s in scene.sequence_editor.sequences_all:
-            if (s.type == "MOVIE"):
-                f_path = s.filepath
-
-                # if strip is already a proxy, do nothing
-                if "_proxy." in f_path:
-                    print("Strip '" + f_path + "' is already a proxy.")
-                    pass
-
-                # or strip is a fullres that has correspondent proxy files...
-                elif "_PRORES." in f_path:
-                    s.filepath = checkProxyFile(f_path, -7)
-                    print("Proxy file for '" + f_path + "' is OK.")
-
-                elif "_MJPEG." in f_path:
-                    s.filepath = checkProxyFile(f_path, -6)
-                    print("Proxy file for '" + f_path + "' is OK.")
-
-                elif "_h264." in f_path:
-                    s.filepath = checkProxyFile(f_path, -5)
-                    print("Proxy file for '" + f_path + "' is OK.")
-
-                # for fullres files without _PRORES or _MJPEG or _h264 in name
-                else:
-                    base_path, ext = os.path.splitext(f_path)
-                    ext_len = len(ext) + 1
-                    # search in folder for any file with the same name appended
-                    # by "_proxy" and with recognizeable movie extension
-                    if glob.glob(base_path + "_proxy.*") and \
-                            ext.lower() in bpy.path.extensions_movie:
-                        s.filepath = glob.glob(base_path + "_proxy.*")[0]
-                        print("Proxy file for '" + f_path + "' is OK.")
-                    else:
-                        print("No proxy file found for '" + f_path + "'.")
-                        pass
-
-            elif (s.type == "SOUND"):
-                # From Blender 2.77 onwards, sound files filepath have to
-                # be referred to as s.sound.filepath instead of s.filepath
-                f_path = s.sound.filepath
-
-                # if strip is already a proxy, do nothing
-                if "_proxy." in f_path:
-                    print("Strip '" + f_path + "' is already a proxy.")
-                    pass
-
-                # or strip is a fullres that has correspondent proxy files...
-                elif "_PRORES." in f_path:
-                    s.sound.filepath = checkProxyFile(f_path, -7)
-                    print("Proxy file for '" + f_path + "' is OK.")
-
-                elif "_MJPEG." in f_path:
-                    s.sound.filepath = checkProxyFile(f_path, -6)
-                    print("Proxy file for '" + f_path + "' is OK.")
-
-                elif "_h264." in f_path:
-                    s.sound.filepath = checkProxyFile(f_path, -5)
-                    print("Proxy file for '" + f_path + "' is OK.")
+        for s in scopedStrips(scene, self.prop_scope, self.prop_channels):
+            # Image strips and sequences swap to folders of JPEG proxies
+            if s.type == "IMAGE":
+                if imageStripToProxy(s, index):
+                    switched += imageStripPaths(s)
+                    print("Image proxies for '" + s.name + "' are OK.")
+                continue
+            if s.type not in {"MOVIE", "SOUND"}:
+                continue
+            f_path = stripFilepath(s)
+
+            # Sound strips play from the source's WAV sidecar, if any
+            if s.type == "SOUND":
+                if isSidecar(f_path):
+                    print("Strip '" + f_path + "' already plays a WAV sidecar.")
+                    continue
+                audio_file = index.audioFor(f_path)
+                if audio_file:
+                    setStripFilepath(s, audio_file)
+                    switched.append(audio_file)
+                    print("WAV sidecar for '" + f_path + "' is OK.")
+                    continue
+
+            # if strip is already a proxy of that size, do nothing
+            current = proxyRung(f_path)
+            if current == rung:
+                print("Strip '" + f_path + "' is already a proxy.")
+                continue
+
+            # if strip is a proxy of another size, switch rungs; or strip is
+            # a fullres (original, _PRORES, _MJPEG or _h264) that has
+            # correspondent proxy files
+            if current:
+                proxy_file = index.rungFor(f_path, rung)
+            else:
+                proxy_file = index.proxyFor(f_path, rung)
+            if proxy_file:
+                setStripFilepath(s, proxy_file)
+                switched.append(proxy_file)
+                print("Proxy file for '" + f_path + "' is OK.")
+            else:
+                print("No proxy file found for '" + f_path + "'.")
 
-                # for fullres files without _PRORES or _MJPEG or _h264 in name
-                else:
-                    base_path, ext = os.path.splitext(f_path)
-                    ext_len = len(ext) + 1
-                    # search in folder for any file with the same name appended
-                    # by "_proxy" and with recognizeable movie extension
-                    if glob.glob(base_path + "_proxy.*") and \
-                            ext.lower() in bpy.path.extensions_movie:
-                        s.sound.filepath = glob.glob(base_path + "_proxy.*")[0]
-                        print("Proxy file for '" + f_path + "' is OK.")
-                    else:
-                        print("No proxy file found for '" + f_path + "'.")
-                        pass
+        index.save()
 
-        # Make all paths relative; behaviour tends to be standard in Blender
-        bpy.ops.file.make_paths_relative()
+        # Proxies in use are the last to be evicted from the cache
+        touchOutputs(switched)
 
         return {'FINISHED'}
 
@@ -164,6 +242,17 @@ class Proxy_Editing_ToFullRes(bpy.types.Operator):
     bl_options = {'REGISTER', 'UNDO'}
     # Shortcuts: Ctrl + Shift + P
 
+    prop_scope: EnumProperty(
+        name="Strips",
+        default='ALL',
+        items=toggle_scopes,
+    )
+    prop_channels: StringProperty(
+        name="Channels",
+        description="Channels to toggle, as in 1, 3-5",
+        default="",
+    )
+
     @classmethod
     def poll(cls, context):
         if bpy.context.sequences:
@@ -171,91 +260,1096 @@ class Proxy_Editing_ToFullRes(bpy.types.Operator):
 
     def execute(self, context):
 
-        # Making strips' paths absolute is necessary for script's execution.
-        bpy.ops.file.make_paths_absolute()
+        # Only the strips that change are rewritten, each one keeping its
+        # path relative or absolute
+
+        # Each folder involved is listed once; every strip is then a lookup
+        index = getMediaIndex()
+
+        # Files the toggled strips play now
+        switched = []
 
         #for s in bpy.context.sequences:
         scene = bpy.context.scene
-        for s in scene.sequence_editor.sequences_all:
-            if (s.type == "MOVIE"):
-                f_path = s.filepath
-
-                # if strip is a proxy and has correspondent fullres files
-                if "_proxy." in f_path:
-                    print("Checking full-res file for '" + f_path + "'...")
-                    base_path, ext = os.path.splitext(f_path)
-                    f_name = base_path[:-6]
-
-                    if glob.glob(f_name + "_PRORES.*"):
-                        s.filepath = glob.glob(f_name + "_PRORES.*")[0]
-                        print("Full-res file found.")
-                    elif glob.glob(f_name + "_MJPEG.*"):
-                        s.filepath = glob.glob(f_name + "_MJPEG.*")[0]
-                        print("Full-res file found.")
-                    elif glob.glob(f_name + "_h264.*"):
-                        s.filepath = glob.glob(f_name + "_h264.*")[0]
-                        print("Full-res file found.")
-                    elif glob.glob(f_name + ".*"):
-                        # if strip's filepath doesn't end with '_MJPEG.mov',
-                        # '_PRORES.mov' or '_h264.mov', script will look for
-                        # files in folder with the same name as the strip in
-                        # the timeline, independent of file's extension
-                        # (ie: .mov, .avi etc).
-                        s.filepath = glob.glob(f_name + ".*")[0]
-                        print("Full-res file found.")
-                    else:
-                        print("No full-res file found for " + f_name + ".")
-                        pass
+        for s in scopedStrips(scene, self.prop_scope, self.prop_channels):
+            if s.type == "IMAGE":
+                if imageStripToFullRes(s, index):
+                    switched += imageStripPaths(s)
+                    print("Full-res images for '" + s.name + "' found.")
+                continue
+            if s.type not in {"MOVIE", "SOUND"}:
+                continue
+            f_path = stripFilepath(s)
+
+            # if strip is a proxy (or a WAV sidecar) and has correspondent
+            # fullres files
+            if proxyRung(f_path) or isSidecar(f_path):
+                print("Checking full-res file for '" + f_path + "'...")
+                fullres_file = index.fullResFor(f_path)
+                if fullres_file:
+                    setStripFilepath(s, fullres_file)
+                    switched.append(fullres_file)
+                    print("Full-res file found.")
                 else:
-                    print("Strip " + f_path + " is not a proxy.")
-                    pass
-
-            elif (s.type == "SOUND"):
-                # From Blender 2.77 onwards, sound files filepath have to
-                # be referred to as s.sound.filepath instead of s.filepath
-                f_path = s.sound.filepath
-
-                if "_proxy." in f_path:
-                    print("Checking full-res file for '" + f_path + "'...")
-                    base_path, ext = os.path.splitext(f_path)
-                    f_name = base_path[:-6]
-
-                    if glob.glob(f_name + "_PRORES.*"):
-                        s.sound.filepath = glob.glob(f_name + "_PRORES.*")[0]
-                        print("Full-res file found.")
-                    elif glob.glob(f_name + "_MJPEG.*"):
-                        s.sound.filepath = glob.glob(f_name + "_MJPEG.*")[0]
-                    elif glob.glob(f_name + "_h264.*"):
-                        s.sound.filepath = glob.glob(f_name + "_h264.*")[0]
-                        print("Full-res file found.")
-                    elif glob.glob(f_name + ".*"):
-                        s.sound.filepath = glob.glob(f_name + ".*")[0]
-                        print("Full-res file found.")
+                    print("No full-res file found for " + f_path + ".")
+            else:
+                print("Strip " + f_path + " is not a proxy.")
+
+        # Intermediates in use are the last to be evicted from the cache
+        touchOutputs(switched)
+
+        return {'FINISHED'}
+
+
+######## ----------------------------------------------------------------------
+######## FFPROBE METADATA CACHE
+######## ----------------------------------------------------------------------
+
+
+def ffprobeCommand(ffCommand):
+    '''Returns the ffprobe binary that comes along with FFMPEG'''
+    folder, name = os.path.split(ffCommand)
+    ffprobe = os.path.join(folder, name.replace("ffmpeg", "ffprobe"))
+    if ffprobe != ffCommand and os.path.isfile(ffprobe):
+        return ffprobe
+    elif which('ffprobe') is not None:
+        return which('ffprobe')
+    else:
+        return ffprobe
+
+
+def frameRate(rate):
+    '''Converts ffprobe's "30000/1001" to 29.97'''
+    num, sep, den = rate.partition("/")
+    try:
+        return float(num) / float(den or 1)
+    except (ValueError, ZeroDivisionError):
+        return 0.0
+
+
+def emptyMeta():
+    '''Returns the metadata of a source ffprobe could not read'''
+    return {'codec': None, 'width': 0, 'height': 0, 'fps': 0.0,
+            'vfr': False, 'duration': 0.0,
+            'a_codec': None, 'a_channels': 0, 'a_layout': None, 'a_rate': 0}
+
+
+def probeSource(ffprobe, path):
+    '''Runs ffprobe once on a source and returns the metadata Velvet
+    Revolver cares about, or None if ffprobe could not read it'''
+    meta = emptyMeta()
+
+    try:
+        out = check_output([ffprobe, "-v", "error", "-print_format", "json",
+                            "-show_format", "-show_streams", path],
+                           universal_newlines=True)
+        data = json.loads(out)
+    except (OSError, CalledProcessError, ValueError) as e:
+        print("ffprobe could not read '" + path + "': " + str(e))
+        return None
+
+    meta['duration'] = float(data.get('format', {}).get('duration', 0.0))
+
+    for stream in data.get('streams', []):
+        # Cover art in MP4/MOV shows up as a one-frame video stream
+        cover = stream.get('disposition', {}).get('attached_pic')
+
+        if stream['codec_type'] == "video" and not cover and not meta['codec']:
+            meta['codec'] = stream.get('codec_name')
+            meta['width'] = stream.get('width', 0)
+            meta['height'] = stream.get('height', 0)
+            r_rate = frameRate(stream.get('r_frame_rate', "0/0"))
+            avg_rate = frameRate(stream.get('avg_frame_rate', "0/0"))
+            meta['fps'] = avg_rate or r_rate
+            # Phone footage is variable frame rate: its average frame rate
+            # differs from the container's base rate
+            meta['vfr'] = bool(r_rate and avg_rate and abs(r_rate - avg_rate) > 0.01)
+
+        elif stream['codec_type'] == "audio" and not meta['a_codec']:
+            meta['a_codec'] = stream.get('codec_name')
+            meta['a_channels'] = stream.get('channels', 0)
+            meta['a_layout'] = stream.get('channel_layout')
+            meta['a_rate'] = int(stream.get('sample_rate', 0))
+
+    return meta
+
+
+def fileKey(path):
+    '''Fingerprints a file by size and modification time'''
+    st = os.stat(path)
+    return "%i|%i" % (st.st_size, st.st_mtime_ns)
+
+
+class ProbeCache(object):
+    """ffprobe results stored on disk, valid while a file keeps its size
+    and modification time"""
+    def __init__(self, cachePath):
+        self.cachePath = cachePath
+        self.lock = threading.Lock()
+        # Keeps two saves from writing the same temporary file
+        self.saveLock = threading.Lock()
+        try:
+            with open(cachePath) as cacheFile:
+                self.entries = json.load(cacheFile)
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def get(self, path):
+        '''Returns cached metadata for path, or None if it is not cached or
+        the file changed since it was probed'''
+        entry = self.entries.get(path)
+        try:
+            if entry and entry['key'] == fileKey(path):
+                return entry['meta']
+        except OSError:
+            pass
+        return None
+
+    def probe(self, ffprobe, paths, workers=8, save=True):
+        '''Returns {path: metadata}, running ffprobe in parallel only for
+        paths not in the cache. Paths that do not exist are left out;
+        files ffprobe cannot read get empty metadata, which is not cached
+        so that they are probed again next time. Callers probing in many
+        small batches pass save=False and save once at the end'''
+        results = {}
+        missing = []
+        for path in paths:
+            meta = self.get(path)
+            if meta is None:
+                missing.append(path)
+            else:
+                results[path] = meta
+
+        if missing:
+            def probeOne(path):
+                # The key is read before probing, so a file changing
+                # meanwhile is probed again next time
+                try:
+                    key = fileKey(path)
+                except OSError:
+                    return None, False
+                meta = probeSource(ffprobe, path)
+                if meta is None:
+                    return emptyMeta(), True
+                with self.lock:
+                    entry = self.entries.get(path)
+                    if entry and entry['key'] == key:
+                        entry['meta'] = meta
+                    else:
+                        self.entries[path] = {'key': key, 'meta': meta}
+                return meta, True
+
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                for path, (meta, found) in zip(missing, executor.map(probeOne, missing)):
+                    if found:
+                        results[path] = meta
                     else:
-                        print("No full-res file found for " + f_name + ".")
-                        pass
+                        print("'" + path + "' does not exist anymore.")
+            if save:
+                self.save()
+
+        return results
+
+    def save(self):
+        with self.saveLock:
+            # Other threads keep adding entries while the copy is written
+            with self.lock:
+                entries = {path: dict(entry) for path, entry in self.entries.items()}
+            tmpPath = self.cachePath + ".tmp"
+            with open(tmpPath, 'w') as cacheFile:
+                json.dump(entries, cacheFile)
+            os.replace(tmpPath, self.cachePath)
+
+
+probe_cache = None
+
+
+def configPath(name):
+    '''Returns the path of a file in Velvet Revolver's config folder'''
+    folder = bpy.utils.user_resource('CONFIG', "velvet_revolver", create=True)
+    return os.path.join(folder, name)
+
+
+def getProbeCache():
+    '''Returns the probe cache shared by Revolver, Proxy Swap and Blue Velvet'''
+    global probe_cache
+    if probe_cache is None:
+        probe_cache = ProbeCache(configPath("probe_cache.json"))
+    return probe_cache
+
+
+######## ----------------------------------------------------------------------
+######## INCREMENTAL RUNS
+######## ----------------------------------------------------------------------
+
+
+def sourceKey(job):
+    '''Identifies the source a job's output was made from: by content for
+    outputs in the shared proxy store, which copies of a source in other
+    projects (with other modification times) use too, and by size and
+    modification time for all others'''
+    return job.fingerprint or fileKey(job.input)
+
+
+class RevolverManifest(object):
+    """Record of finished jobs: source fingerprint, encoding profile and
+    output size, keyed by output path"""
+    def __init__(self, manifestPath):
+        self.manifestPath = manifestPath
+        try:
+            with open(manifestPath) as manifestFile:
+                self.entries = json.load(manifestFile)
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def state(self, job):
+        '''Returns 'CURRENT' if job's output is up to date, 'STALE' if it was
+        made from an older source or another profile, 'UNKNOWN' otherwise'''
+        entry = self.entries.get(job.v_output)
+        if entry is None:
+            return 'UNKNOWN'
+        try:
+            if entry['source'] == sourceKey(job) and \
+               entry['profile'] == job.profile() and \
+               entry['size'] == os.path.getsize(job.v_output):
+                return 'CURRENT'
+        except OSError:
+            pass
+        return 'STALE'
+
+    def record(self, job):
+        self.entries[job.v_output] = {'source': sourceKey(job),
+                                      'profile': job.profile(),
+                                      'size': os.path.getsize(job.v_output),
+                                      'used': time.time()}
+
+    def touch(self, path):
+        '''Marks an output as just used. Returns False if path is not an
+        output'''
+        entry = self.entries.get(os.path.normpath(path))
+        if entry is None:
+            return False
+        entry['used'] = time.time()
+        return True
+
+    def save(self):
+        tmpPath = self.manifestPath + ".tmp"
+        with open(tmpPath, 'w') as manifestFile:
+            json.dump(self.entries, manifestFile)
+        os.replace(tmpPath, self.manifestPath)
+
+
+revolver_manifest = None
+
+
+def getManifest():
+    '''Returns the manifest of jobs finished by previous Revolver runs'''
+    global revolver_manifest
+    if revolver_manifest is None:
+        revolver_manifest = RevolverManifest(configPath("revolver_manifest.json"))
+    return revolver_manifest
+
+
+######## ----------------------------------------------------------------------
+######## OUTPUT CACHE EVICTION
+######## ----------------------------------------------------------------------
+
+
+def referencedPaths():
+    '''Returns the absolute paths of all media used by the open .blend'''
+    paths = set()
+    for scene in bpy.data.scenes:
+        if not scene.sequence_editor:
+            continue
+        for s in scene.sequence_editor.sequences_all:
+            if s.type == "MOVIE":
+                paths.add(bpy.path.abspath(s.filepath))
+                if s.use_proxy:
+                    folder = stripProxyFolder(scene, s)
+                    paths.update(os.path.join(folder, "proxy_%i.avi" % size)
+                                 for size in (25, 50, 75, 100))
+            elif s.type == "SOUND":
+                paths.add(bpy.path.abspath(s.sound.filepath))
+            elif s.type == "IMAGE":
+                paths.update(imageStripPaths(s))
+    for datablock in list(bpy.data.movieclips) + list(bpy.data.sounds):
+        paths.add(bpy.path.abspath(datablock.filepath))
+    return set(os.path.normpath(p) for p in paths)
+
+
+def touchOutputs(paths):
+    '''Marks the outputs among paths as just used. The manifest is only
+    written when one of them is an output'''
+    manifest = getManifest()
+    touched = [path for path in paths if manifest.touch(path)]
+    if touched:
+        manifest.save()
+
+
+def trimOutputs(capBytes, protected):
+    '''Deletes the least recently used proxies and intermediates until all
+    outputs known to the manifest take at most capBytes. Outputs in
+    protected are never deleted. Returns (files deleted, bytes freed)'''
+    manifest = getManifest()
+
+    # Forget outputs deleted by hand
+    for path in list(manifest.entries):
+        if not os.path.isfile(path):
+            del manifest.entries[path]
+
+    entries = sorted(manifest.entries.items(), key=lambda e: e[1].get('used', 0))
+    total = sum(entry['size'] for path, entry in entries)
+    deleted = freed = 0
+
+    for path, entry in entries:
+        if total <= capBytes:
+            break
+        if os.path.normpath(path) in protected:
+            continue
+        try:
+            os.remove(path)
+        except OSError as e:
+            print("Could not delete '" + path + "': " + str(e))
+            continue
+        del manifest.entries[path]
+        total -= entry['size']
+        freed += entry['size']
+        deleted += 1
+        print("Deleted '" + path + "'.")
+
+    manifest.save()
+    return deleted, freed
+
+
+def trimCommand(argv):
+    '''Headless cleanup, ie. for a nightly job:
+    blender -b -P velvet_revolver.py -- --trim 500 --protect a.blend b.blend
+    trims outputs to 500 GB, keeping those used by the given .blend files'''
+    capGB = float(argv[argv.index("--trim") + 1])
+    protected = set()
+    if "--protect" in argv:
+        for blend in argv[argv.index("--protect") + 1:]:
+            if blend.startswith("--"):
+                break
+            bpy.ops.wm.open_mainfile(filepath=blend)
+            protected |= referencedPaths()
+    elif bpy.data.filepath:
+        protected = referencedPaths()
+
+    deleted, freed = trimOutputs(int(capGB * 1024 ** 3), protected)
+    print("Velvet Revolver: deleted %i files, freed %.2f GB." % (deleted, freed / 1024 ** 3))
+
+
+######## ----------------------------------------------------------------------
+######## LOCAL PROXY FOLDER
+######## ----------------------------------------------------------------------
+
+
+def mirroredPath(root, path):
+    '''Maps path to the same path under root, ie. /mnt/nas/a.mov becomes
+    <root>/mnt/nas/a.mov and C:\\a.mov becomes <root>\\C\\a.mov'''
+    drive, rest = os.path.splitdrive(os.path.abspath(path))
+    drive = drive.replace(":", "").strip("\\/")
+    return os.path.join(root, drive, rest.lstrip("\\/"))
+
+
+def unmirroredPath(root, path):
+    '''Reverses mirroredPath(); returns None if path is not under root'''
+    try:
+        relPath = os.path.relpath(os.path.abspath(path), root)
+    except ValueError:
+        # Windows: path on another drive than root
+        return None
+    if relPath.startswith(os.pardir):
+        return None
+    if os.name != 'nt':
+        return os.sep + relPath
+    first, sep, rest = relPath.partition(os.sep)
+    if len(first) == 1:
+        # Drive letter
+        return first + ":" + os.sep + rest
+    # Network share, ie. \\server\share
+    return os.sep * 2 + relPath
+
+
+def getProxyRoot():
+    '''Returns the local proxy folder set in the preferences, or None'''
+    preferences = bpy.context.preferences.addons['velvet_revolver'].preferences
+    if not preferences.proxyRoot:
+        return None
+    return os.path.normpath(bpy.path.abspath(preferences.proxyRoot))
+
+
+######## ----------------------------------------------------------------------
+######## SHARED PROXY STORE
+######## ----------------------------------------------------------------------
+
+
+def contentFingerprint(path, chunk=4 * 1024 * 1024):
+    '''Identifies a file by its content, fast: its size plus a hash of its
+    first and last 4 MB. Copies of a camera card in several projects share
+    the same fingerprint wherever they are'''
+    size = os.path.getsize(path)
+    sha = hashlib.sha1()
+    if size:
+        with open(path, 'rb') as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+                sha.update(m[:chunk])
+                sha.update(m[max(chunk, size - chunk):])
+    return "%i-%s" % (size, sha.hexdigest()[:20])
+
+
+def cachedFingerprint(path):
+    '''Returns contentFingerprint(path), kept in the probe cache so that
+    unchanged files are never read again'''
+    cache = getProbeCache()
+    key = fileKey(path)
+    with cache.lock:
+        entry = cache.entries.get(path)
+        if entry and entry['key'] == key and entry.get('fingerprint'):
+            return entry['fingerprint']
+    fingerprint = contentFingerprint(path)
+    with cache.lock:
+        entry = cache.entries.get(path)
+        if not entry or entry['key'] != key:
+            entry = cache.entries[path] = {'key': key, 'meta': None}
+        entry['fingerprint'] = fingerprint
+    return fingerprint
+
+
+def profileKey(profile):
+    '''Shortens an encoding profile to a few characters for file names'''
+    return hashlib.sha1(profile.encode()).hexdigest()[:8]
+
+
+class ProxyStore(object):
+    """A folder of proxies shared by all projects, named after the content
+    fingerprint of their sources. Its index remembers where the sources
+    of each proxy were seen"""
+    def __init__(self, root):
+        self.root = root
+        self.indexPath = os.path.join(root, "index.json")
+        self.lock = threading.Lock()
+        try:
+            with open(self.indexPath) as indexFile:
+                self.index = json.load(indexFile)
+        except (OSError, ValueError):
+            self.index = {}
+
+    def proxyPath(self, fingerprint, profile, v_size, rung=100):
+        return os.path.join(self.root, fingerprint[-2:], "%s_%s_%s%s.mov"
+                            % (fingerprint, v_size, profileKey(profile),
+                               rungSuffix(rung)))
+
+    def audioPath(self, fingerprint, profile):
+        return os.path.join(self.root, fingerprint[-2:], "%s_%s%s.wav"
+                            % (fingerprint, profileKey(profile), audio_suffix))
+
+    def find(self, fingerprint, suffix):
+        '''Returns the newest file of the store made from fingerprint whose
+        name ends with suffix, or None. Projects with other settings
+        leave files with other profiles side by side'''
+        folder = os.path.join(self.root, fingerprint[-2:])
+        try:
+            found = [entry for entry in os.scandir(folder)
+                     if entry.name.startswith(fingerprint + "_")
+                     and entry.name.endswith(suffix)]
+        except OSError:
+            return None
+        if not found:
+            return None
+        return max(found, key=lambda entry: entry.stat().st_mtime).path
+
+    def register(self, fingerprint, source):
+        with self.lock:
+            sources = self.index.setdefault(fingerprint, [])
+            if source in sources:
+                sources.remove(source)
+            # Latest location first
+            sources.insert(0, source)
+
+    def proxyFor(self, source, rung=100):
+        '''Returns a proxy of source in the store, or None'''
+        fingerprint = cachedFingerprint(source)
+        proxy = self.find(fingerprint, rungSuffix(rung) + ".mov")
+        if proxy:
+            self.register(fingerprint, source)
+        return proxy
+
+    def audioFor(self, source):
+        '''Returns the WAV sidecar of source in the store, or None'''
+        fingerprint = cachedFingerprint(source)
+        audio = self.find(fingerprint, audio_suffix + ".wav")
+        if audio:
+            self.register(fingerprint, source)
+        return audio
+
+    def sourceFor(self, proxy):
+        '''Returns an existing source of a proxy in the store, or None'''
+        if os.path.dirname(os.path.dirname(proxy)) != os.path.normpath(self.root):
+            return None
+        fingerprint = os.path.basename(proxy).split("_")[0]
+        for source in self.index.get(fingerprint, []):
+            if os.path.isfile(source):
+                return source
+        return None
+
+    def save(self):
+        with self.lock:
+            tmpPath = self.indexPath + ".tmp"
+            with open(tmpPath, 'w') as indexFile:
+                json.dump(self.index, indexFile)
+            os.replace(tmpPath, self.indexPath)
+
+
+def getProxyStore():
+    '''Returns the shared proxy store set in the preferences, or None'''
+    preferences = bpy.context.preferences.addons['velvet_revolver'].preferences
+    if not preferences.proxyStore:
+        return None
+    root = os.path.normpath(bpy.path.abspath(preferences.proxyStore))
+    os.makedirs(root, exist_ok=True)
+    return ProxyStore(root)
+
+
+######## ----------------------------------------------------------------------
+######## DIRECTORY INDEX
+######## ----------------------------------------------------------------------
+
+
+class DirectoryIndex(object):
+    """A single listing of a folder that maps each base name to the files
+    made from it: original, _proxy (and its ladder rungs), _PRORES, _MJPEG,
+    _h264 and _revolver_audio"""
+    def __init__(self, folder):
+        self.folder = folder
+        self.mtime = os.stat(folder).st_mtime_ns
+        self.variants = {}
+        self.names = set()
+        for entry in sorted(os.scandir(folder), key=lambda e: e.name):
+            if entry.name.startswith(".") or not entry.is_file():
+                continue
+            self.names.add(entry.name)
+            base, ext = os.path.splitext(entry.name)
+            suffix = ""
+            for variant in variant_suffixes:
+                if base.endswith(variant):
+                    base, suffix = base[:-len(variant)], variant
+                    break
+            self.variants.setdefault(base, {}).setdefault(suffix, []).append(entry.name)
+
+    def find(self, base, suffixes, ext=None):
+        '''Returns the first file named base + one of suffixes, with a media
+        extension, preferring ext when there are several'''
+        variants = self.variants.get(base, {})
+        valid = bpy.path.extensions_movie | bpy.path.extensions_audio
+        for suffix in suffixes:
+            names = [n for n in variants.get(suffix, [])
+                     if os.path.splitext(n)[1].lower() in valid]
+            if not names:
+                continue
+            for name in names:
+                if ext and os.path.splitext(name)[1] == ext:
+                    return os.path.join(self.folder, name)
+            return os.path.join(self.folder, names[0])
+        return None
+
+
+# Listings kept between toggles, valid while their folder's mtime (which
+# changes when files are added, removed or renamed) stays the same
+directory_indexes = {}
+
+
+class MediaIndex(object):
+    """Resolves proxies and full-res files of strips, listing each folder
+    involved once. Folders are looked up in the local proxy folder first,
+    then beside the sources, then in the shared proxy store"""
+    def __init__(self, root=None, store=None, remember=True):
+        self.root = root
+        self.store = store
+        self.remember = remember
+        self.checked = {}
+
+    def folder(self, folder):
+        '''Returns the DirectoryIndex of folder, or None if it does not exist'''
+        if folder not in self.checked:
+            cached = directory_indexes.get(folder) if self.remember else None
+            try:
+                if cached is None or cached.mtime != os.stat(folder).st_mtime_ns:
+                    cached = directory_indexes[folder] = DirectoryIndex(folder)
+            except OSError:
+                cached = None
+            self.checked[folder] = cached
+        return self.checked[folder]
+
+    def find(self, base_path, suffixes, ext=None):
+        folder, base = os.path.split(base_path)
+        index = self.folder(folder)
+        if index is None:
+            return None
+        return index.find(base, suffixes, ext)
+
+    def proxyFor(self, f_path, rung=100):
+        '''Returns the proxy of a full-res file, or None'''
+        base_path, ext = os.path.splitext(f_path)
+        if ext.lower() not in bpy.path.extensions_movie:
+            return None
+        base_path = sourceBase(f_path)
+
+        if self.root:
+            proxy_file = self.find(mirroredPath(self.root, base_path),
+                                   (rungSuffix(rung),), ext)
+            if proxy_file:
+                return proxy_file
+        proxy_file = self.find(base_path, (rungSuffix(rung),), ext)
+        if proxy_file:
+            return proxy_file
+        if self.store and os.path.isfile(f_path):
+            return self.store.proxyFor(f_path, rung)
+        return None
+
+    def audioFor(self, f_path):
+        '''Returns the WAV sidecar of a source, or None'''
+        base_path = sourceBase(f_path)
+        if self.root:
+            audio_file = self.find(mirroredPath(self.root, base_path),
+                                   (audio_suffix,), ".wav")
+            if audio_file:
+                return audio_file
+        audio_file = self.find(base_path, (audio_suffix,), ".wav")
+        if audio_file:
+            return audio_file
+        if self.store and os.path.isfile(f_path):
+            return self.store.audioFor(f_path)
+        return None
+
+    def imageProxiesFor(self, folder, names):
+        '''Returns the folder and file names of the JPEG proxies of images
+        in folder, or None unless every image has one'''
+        proxyFolder = imageProxyFolder(folder, self.root)
+        index = self.folder(proxyFolder)
+        proxies = [name + image_proxy_ext for name in names]
+        if index is None or not all(name in index.names for name in proxies):
+            return None
+        return proxyFolder, proxies
+
+    def imagesFor(self, proxyFolder, names):
+        '''Returns the folder and file names of the images JPEG proxies
+        were made from, or None unless every image is there'''
+        folder = imageSourceFolder(proxyFolder, self.root)
+        index = self.folder(folder) if folder else None
+        images = [os.path.splitext(name)[0] for name in names]
+        if index is None or not all(name in index.names for name in images):
+            return None
+        return folder, images
+
+    def rungFor(self, f_path, rung):
+        '''Returns the proxy of another ladder rung than the proxy f_path,
+        or None. Rungs are looked up beside f_path, then from its source'''
+        rung_file = self.find(sourceBase(f_path), (rungSuffix(rung),))
+        if rung_file:
+            return rung_file
+        source = self.sourceFor(f_path)
+        if source:
+            return self.proxyFor(source, rung)
+        return None
+
+    def fullResFor(self, f_path):
+        '''Returns the full-res file of a proxy, or None. Intermediates
+        (_PRORES, _MJPEG, _h264) are preferred over original files'''
+        if self.store:
+            source = self.store.sourceFor(f_path)
+            if source:
+                return source
+
+        base_path = sourceBase(f_path)
+        if self.root and unmirroredPath(self.root, base_path):
+            base_path = unmirroredPath(self.root, base_path)
+        return self.find(base_path, ("_PRORES", "_MJPEG", "_h264", ""))
+
+    def sourceFor(self, f_path):
+        '''Returns the original file a strip's file was made from (the
+        file itself if it is not a proxy or an intermediate), or None'''
+        if self.store:
+            f_path = self.store.sourceFor(f_path) or f_path
+
+        base_path = sourceBase(f_path)
+        if os.path.splitext(os.path.normpath(f_path))[0] == base_path:
+            return f_path
+        if self.root and unmirroredPath(self.root, base_path):
+            base_path = unmirroredPath(self.root, base_path)
+        return self.find(base_path, ("",))
+
+    def save(self):
+        '''Keeps fingerprints and sources found in the proxy store'''
+        if self.store:
+            self.store.save()
+            getProbeCache().save()
+
+
+def getMediaIndex():
+    '''Returns a MediaIndex following Velvet Revolver's preferences'''
+    preferences = bpy.context.preferences.addons['velvet_revolver'].preferences
+    return MediaIndex(getProxyRoot(), getProxyStore(), preferences.rememberFolders)
+
+
+######## ----------------------------------------------------------------------
+######## FULL-RES RENDERING
+######## ----------------------------------------------------------------------
+
+
+# Strips swapped to full-res for the render in progress, per scene:
+# (strip name, path before the swap)
+render_swaps = {}
+
+
+@persistent
+def swapToFullRes(scene, *args):
+    '''Points proxy strips to their full-res files before a render'''
+    preferences = bpy.context.preferences.addons['velvet_revolver'].preferences
+    if not preferences.renderFullRes or not scene.sequence_editor:
+        return
+
+    # Folder listings are those kept by the last toggles, so this is
+    # a lookup per strip unless files were added since
+    index = getMediaIndex()
+    swaps = []
+    for s in scene.sequence_editor.sequences_all:
+        if s.type == "IMAGE":
+            if imageStripToFullRes(s, index):
+                swaps.append((s.name, None))
+            continue
+        if s.type not in {"MOVIE", "SOUND"}:
+            continue
+        f_path = stripFilepath(s)
+        if not proxyRung(f_path):
+            continue
+        fullres_file = index.fullResFor(f_path)
+        if fullres_file:
+            swaps.append((s.name, f_path))
+            setStripFilepath(s, fullres_file)
+        else:
+            print("Rendering proxy '" + f_path + "': no full-res file found.")
+
+    if swaps:
+        render_swaps[scene.name] = swaps
+        print("Velvet Revolver: rendering %i strips at full resolution." % len(swaps))
+
+
+@persistent
+def restoreProxies(scene, *args):
+    '''Points strips swapped by swapToFullRes back to their proxies'''
+    swaps = render_swaps.pop(scene.name, [])
+    if not swaps or not scene.sequence_editor:
+        return
+    strips = scene.sequence_editor.sequences_all
+    index = getMediaIndex()
+    for name, f_path in swaps:
+        s = strips.get(name)
+        if s is None:
+            continue
+        # Image strips carry no single path; their proxies are found again
+        if f_path is None:
+            imageStripToProxy(s, index)
+        else:
+            setStripFilepath(s, f_path)
+
+
+######## ----------------------------------------------------------------------
+######## PLAYBACK GOVERNOR
+######## ----------------------------------------------------------------------
+
+
+# Blender proxy sizes of the preview, from largest to smallest
+preview_proxy_sizes = ('PROXY_100', 'PROXY_75', 'PROXY_50', 'PROXY_25')
+
+
+class PlaybackGovernor(object):
+    """Measures playback speed and, while frames are dropped, moves the strips
+    under the playhead to smaller proxy rungs (or the preview to a smaller
+    Blender proxy size). Everything goes back when playback stops"""
+    interval = 0.5
+
+    def __init__(self):
+        self.times = []
+        self.slow = 0
+        # (scene name, strip name): path before the governor changed it
+        self.swapped = {}
+        # [(space, proxy_render_size before the governor changed it)]
+        self.spaces = []
+
+    def frameChanged(self, scene, *args):
+        self.times.append(time.perf_counter())
+        del self.times[:-240]
+
+    def tick(self):
+        '''Timer callback: compares the fps achieved in the last second
+        with the scene's, every interval seconds'''
+        preferences = bpy.context.preferences.addons['velvet_revolver'].preferences
+        wm = bpy.context.window_manager
+        playing = [w for w in wm.windows if w.screen.is_animation_playing]
+
+        if not preferences.playbackGovernor or not playing:
+            self.times.clear()
+            self.slow = 0
+            if self.swapped or self.spaces:
+                self.restore()
+            return self.interval
+
+        now = time.perf_counter()
+        self.times = [t for t in self.times if now - t <= 1.0]
+        if len(self.times) < 2:
+            return self.interval
+
+        scene = playing[0].scene
+        fps = (len(self.times) - 1) / (self.times[-1] - self.times[0])
+        target = scene.render.fps / scene.render.fps_base
+        # Two slow readings in a row, so a single hiccup does not count
+        self.slow = self.slow + 1 if fps < target * 0.9 else 0
+        if self.slow >= 2:
+            print("Velvet Revolver: playing at %.1f of %.2f fps." % (fps, target))
+            self.stepDown(scene, playing)
+            self.slow = 0
+            self.times.clear()
+        return self.interval
+
+    def stepDown(self, scene, windows):
+        '''Moves the movie strips under the playhead one rung down the proxy
+        ladder. When none has a smaller rung, lowers the preview's Blender
+        proxy size instead'''
+        if not scene.sequence_editor:
+            return
+        frame = scene.frame_current
+        strips = [s for s in scene.sequence_editor.sequences_all
+                  if s.type == "MOVIE" and not s.mute
+                  and s.frame_final_start <= frame < s.frame_final_end]
+
+        index = getMediaIndex()
+        stepped = False
+        for s in strips:
+            f_path = stripFilepath(s)
+            rung = proxyRung(f_path)
+            for smaller in proxy_rungs:
+                if rung and smaller >= rung:
+                    continue
+                if rung:
+                    proxy_file = index.rungFor(f_path, smaller)
                 else:
-                    print("Strip " + f_path + " is not a proxy.")
-                    pass
+                    proxy_file = index.proxyFor(f_path, smaller)
+                if proxy_file:
+                    self.swapped.setdefault((scene.name, s.name), f_path)
+                    setStripFilepath(s, proxy_file)
+                    stepped = True
+                    break
+        if stepped or not any(s.use_proxy for s in strips):
+            return
+
+        for window in windows:
+            for area in window.screen.areas:
+                if area.type != 'SEQUENCE_EDITOR':
+                    continue
+                space = area.spaces.active
+                if space.view_type not in {'PREVIEW', 'SEQUENCER_PREVIEW'}:
+                    continue
+                size = space.proxy_render_size
+                if size == preview_proxy_sizes[-1]:
+                    continue
+                if size in preview_proxy_sizes:
+                    smaller = preview_proxy_sizes[preview_proxy_sizes.index(size) + 1]
+                else:
+                    smaller = preview_proxy_sizes[0]
+                if not any(space == other for other, original in self.spaces):
+                    self.spaces.append((space, size))
+                space.proxy_render_size = smaller
 
-        # Make all paths relative; behaviour tends to be standard in Blender
-        bpy.ops.file.make_paths_relative()
+    def restore(self):
+        '''Puts back what stepDown changed'''
+        for (scene_name, strip_name), f_path in self.swapped.items():
+            scene = bpy.data.scenes.get(scene_name)
+            if scene is None or not scene.sequence_editor:
+                continue
+            s = scene.sequence_editor.sequences_all.get(strip_name)
+            if s is not None:
+                setStripFilepath(s, f_path)
+        for space, size in self.spaces:
+            try:
+                space.proxy_render_size = size
+            except ReferenceError:
+                # The area was closed meanwhile
+                pass
+        self.swapped.clear()
+        self.spaces.clear()
+
+
+playback_governor = PlaybackGovernor()
+
+
+@persistent
+def governorFrame(scene, *args):
+    playback_governor.frameChanged(scene)
 
-        return {'FINISHED'}
+
+def governorTick():
+    # Timers are told apart by identity, and each playback_governor.tick
+    # is a new bound method: this one function can be unregistered
+    return playback_governor.tick()
+
+
+def governorEntry(self, context):
+    preferences = bpy.context.preferences.addons['velvet_revolver'].preferences
+    self.layout.prop(preferences, "playbackGovernor")
 
 
 ######## ----------------------------------------------------------------------
 ######## FFMPEG TRANSCODING
 ######## ----------------------------------------------------------------------
 
-class VideoSource(object):
-    """Uses video source to run FFMPEG and encode proxies or full-res intermediates"""
-    def __init__(self, ffCommand, filepath, v_source, v_res, v_res_w, v_res_h, v_format,
-                 fps, deinter, ar, ac, ow):
+class RevolverJob(object):
+    """A process the RevolverPool runs: FFMPEG (or Blender) reading input and
+    writing the files of the OutputJobs returned by outputs()"""
+    # Jobs that must finish before this one can start
+    after = ()
+
+    def __init__(self, ffCommand, v_source, v_res, fps=1, threads=0, meta=None):
         self.ffCommand = ffCommand
         self.input = v_source
-        self.filepath = filepath
+        self.v_res = v_res
         self.fps = fps
+        # Number of threads FFMPEG may use; 0 lets FFMPEG decide by itself
+        self.threads = threads
+        # ffprobe metadata of the source, if known
+        self.meta = meta or {}
+
+    def threadArgs(self):
+        '''Returns the -threads option of FFMPEG, if a thread count is set'''
+        if self.threads:
+            return ["-threads", str(self.threads)]
+        return []
+
+    def ffArgs(self):
+        '''Returns the FFMPEG command as a list of arguments. Being a list,
+        spaces in ffCommand, input and output need no escaping'''
+        raise NotImplementedError
+
+    def outputs(self):
+        '''Returns the OutputJobs whose files this job writes'''
+        return []
+
+    def start(self):
+        '''Starts FFMPEG without waiting for it and returns its process.
+        FFMPEG reports its progress as key=value lines on stdout'''
+        args = self.ffArgs()
+        print(" ".join(args))
+        args[1:1] = ["-progress", "pipe:1", "-nostats"]
+        self.progress = FFProgress(self.fps, self.meta.get('duration', 0.0))
+        proc = Popen(args, stdout=PIPE, stderr=PIPE, universal_newlines=True)
+        self.progress.watch(proc, self.verify)
+        return proc
+
+    def verify(self, returncode):
+        '''Tells if FFMPEG ended well and wrote every output whole. Runs in
+        the progress-reader thread: ffprobe may take a while on a share'''
+        return returncode == 0 and all(out.complete() for out in self.outputs())
+
+    def kill(self, proc):
+        '''Stops a running FFMPEG and removes the half-written outputs'''
+        proc.kill()
+        proc.wait()
+        for out in self.outputs():
+            if os.path.exists(out.v_partial):
+                os.remove(out.v_partial)
+
+    def finished(self, returncode):
+        '''Checks the outcome of an FFMPEG run. When all outputs are complete
+        they are renamed in place (atomically, being in the same folder);
+        otherwise they are thrown away. Outputs were already checked by
+        verify'''
+        outputs = self.outputs()
+        complete = returncode == 0 and bool(self.progress.verified)
+
+        for out in outputs:
+            # Without overwriting, an output that showed up meanwhile stays
+            if complete and (out.overwrite == " -y" or not os.path.exists(out.v_output)):
+                os.replace(out.v_partial, out.v_output)
+            elif os.path.exists(out.v_partial):
+                os.remove(out.v_partial)
+
+        if complete:
+            return {'FINISHED'}
+        else:
+            return {'CANCELED'}
+
+    def cleanup(self):
+        '''Removes temporary files of a job that will not run'''
+        pass
+
+    def device(self):
+        '''Returns the storage device this job reads from'''
+        return os.stat(self.input).st_dev
+
+    def cost(self):
+        '''Estimates the work of this job: duration times pixel count of the
+        source, or its file size when it could not be probed'''
+        pixels = self.meta.get('width', 0) * self.meta.get('height', 0)
+        if self.meta.get('duration') and pixels:
+            return self.meta['duration'] * pixels
+        return os.path.getsize(self.input)
+
+
+class OutputJob(RevolverJob):
+    """A job writing one file, v_output. Several of them may also run
+    together as the outputs of a single job, ie. MultiOutputSource"""
+    # Content fingerprint of the source, for outputs in the shared store
+    fingerprint = None
+
+    def __init__(self, ffCommand, v_source, v_res, ow, fps=1, threads=0, meta=None):
+        RevolverJob.__init__(self, ffCommand, v_source, v_res, fps, threads, meta)
+
+        if ow:
+            self.overwrite = " -y"
+        else:
+            self.overwrite = " -n"
+
+    def profile(self):
+        '''Describes the encoding settings; a change in any of them makes
+        previous outputs out of date'''
+        raise NotImplementedError
+
+    def outputs(self):
+        return [self]
+
+    @property
+    def v_partial(self):
+        '''Hidden file next to v_output that FFMPEG actually writes. It only
+        becomes v_output once complete, so a killed or crashed job never
+        leaves a file that looks finished'''
+        folder, name = os.path.split(self.v_output)
+        base, ext = os.path.splitext(name)
+        return os.path.join(folder, ".%s.part%s" % (base, ext))
+
+    def complete(self):
+        '''Tells if v_partial holds the whole source, ie. ffprobe finds it
+        as long as the source'''
+        if not os.path.isfile(self.v_partial) or not os.path.getsize(self.v_partial):
+            return False
+        expected = self.meta.get('duration', 0.0)
+        if not expected:
+            return True
+        meta = probeSource(ffprobeCommand(self.ffCommand), self.v_partial)
+        if meta is None:
+            return False
+        duration = meta['duration']
+        # Levelling frame rates may shift the end by a frame or so
+        return abs(duration - expected) <= max(1.0, expected * 0.01)
+
+
+class VideoSource(OutputJob):
+    """Uses video source to run FFMPEG and encode proxies or full-res intermediates"""
+    def __init__(self, ffCommand, filepath, v_source, v_res, v_res_w, v_res_h, v_format,
+                 fps, deinter, ar, ac, ow, threads=0, meta=None, rung=100):
+        OutputJob.__init__(self, ffCommand, v_source, v_res, ow, fps, threads, meta)
+        self.filepath = filepath
+        self.rung = rung
         self.arate = str(ar)
 
         self.v_size = "%sx%s" % (v_res_w, v_res_h)
@@ -270,14 +1364,10 @@ class VideoSource(object):
         else:
             self.achannels = ""
 
-        if ow:
-            self.overwrite = " -y"
-        else:
-            self.overwrite = " -n"
-
         if v_res == "proxy":
-            # Proxy files generated by Velvet Revolver end with "_proxy.mov"
-            self.v_output = self.input[:-4] + "_proxy.mov"
+            # Proxy files generated by Velvet Revolver end with "_proxy.mov",
+            # or "_proxy50.mov" and "_proxy25.mov" for smaller ladder rungs
+            self.v_output = os.path.splitext(self.input)[0] + rungSuffix(rung) + ".mov"
             if v_format == "is_prores":
                 self.format = "-probesize 5000000 -c:v prores \
                                -profile:v 0 -qscale:v 13 -vendor ap10 \
@@ -292,40 +1382,1683 @@ class VideoSource(object):
                 # dealing with ProRes422 from Final Cut
         else: # v_res == "fullres"
             if v_format == "is_prores":
-                self.v_output = self.input[:-4] + "_PRORES.mov"
+                self.v_output = os.path.splitext(self.input)[0] + "_PRORES.mov"
                 self.format = "-probesize 5000000 -c:v prores -profile:v 3 \
                                -qscale:v 5 -vendor ap10 -pix_fmt yuv422p10le \
                                -pix_fmt yuvj422p -acodec pcm_s16be"
             elif v_format == "is_mjpeg":
-                self.v_output = self.input[:-4] + "_MJPEG.mov"
+                self.v_output = os.path.splitext(self.input)[0] + "_MJPEG.mov"
                 self.format = "-probesize 5000000 -c:v mjpeg -qscale:v 1 \
                                -acodec pcm_s16be"
             else: # v_format == "is_h264":
-                self.v_output = self.input[:-4] + "_h264.mkv"
+                self.v_output = os.path.splitext(self.input)[0] + "_h264.mkv"
                 self.format = "-probesize 5000000 -c:v libx264 -pix_fmt yuv420p \
                                -g 1 -sn -crf 25 -preset ultrafast -tune fastdecode -c:a copy"
                 # -preset ultrafast was having problems
                 # dealing with ProRes422 from Final Cut
 
-    def runFF(self):
-        # Due to spaces, the command entries (ffCommand, input and output) have
-        # to be read as strings by the call command, thus the escapings below
-        callFFMPEG = "\"%s\" -hwaccel auto -i \"%s\" %s -r %s -s %s%s%s -ar %s%s \"%s\"" \
-                     % (self.ffCommand, self.input, self.format, self.fps, self.v_size,
-                        self.deinter, self.achannels, self.arate, self.overwrite, self.v_output)
+    def profile(self):
+        return " ".join(self.format.split() + ["-r", str(self.fps), "-s", self.v_size]
+                        + self.deinter.split() + self.achannels.split()
+                        + ["-ar", self.arate])
+
+
+    def ffArgs(self):
+        threads = self.threadArgs()
+
+        # -nostdin keeps parallel FFMPEGs from fighting for the terminal
+        args = [self.ffCommand, "-nostdin", "-hwaccel", "auto"] + threads
+        args += ["-i", self.input] + self.format.split()
+        args += ["-r", str(self.fps), "-s", self.v_size] + threads
+        args += self.deinter.split() + self.achannels.split()
+        args += ["-ar", self.arate, "-y", self.v_partial]
+
+        return args
+
+    def scale(self):
+        '''Returns the size of this output for FFMPEG's scale filter'''
+        return self.v_size.replace("x", ":")
+
+    def mapArgs(self, label, threads):
+        '''Returns the arguments that encode this output from the filter
+        graph output label, when it shares a decode with others'''
+        return (["-map", label, "-map", "0:a:0?"] + self.format.split()
+                + ["-r", str(self.fps)] + threads + self.achannels.split()
+                + ["-ar", self.arate, self.v_partial])
+
+
+class AudioSidecar(OutputJob):
+    """Writes the audio of a source to a PCM WAV file, which Blender plays
+    and draws waveforms from without demuxing and decoding the movie"""
+    def __init__(self, ffCommand, filepath, v_source, fps, ar, ac, ow,
+                 threads=0, meta=None):
+        OutputJob.__init__(self, ffCommand, v_source, "audio", ow, fps, threads, meta)
+        self.filepath = filepath
+        self.arate = str(ar)
+
+        if ac:
+            self.achannels = " -ac 1"
+        else:
+            self.achannels = ""
+
+        # WAV sidecars generated by Velvet Revolver end with "_revolver_audio.wav"
+        self.v_output = os.path.splitext(self.input)[0] + audio_suffix + ".wav"
+        self.format = "-vn -c:a pcm_s16le"
+
+    def profile(self):
+        return " ".join(self.format.split() + self.achannels.split()
+                        + ["-ar", self.arate])
+
+    def outputArgs(self):
+        '''Returns the arguments that write this sidecar from input 0'''
+        return (["-map", "0:a:0"] + self.format.split() + self.achannels.split()
+                + ["-ar", self.arate, self.v_partial])
+
+    def ffArgs(self):
+        args = [self.ffCommand, "-nostdin"] + self.threadArgs()
+        args += ["-i", self.input, "-y"] + self.outputArgs()
+
+        return args
+
+
+def blenderProxyFolder(source, projectDir=None):
+    '''Returns the folder where Blender's proxy system looks for the proxies
+    of a movie: BL_proxy/<file name> beside it, or <file name> inside the
+    project's proxy folder'''
+    folder, name = os.path.split(source)
+    if projectDir:
+        return os.path.join(projectDir, name)
+    return os.path.join(folder, "BL_proxy", name)
+
+
+class BlenderProxy(OutputJob):
+    """Writes a proxy named and placed as Blender's own proxy system does
+    (proxy_50.avi), so the preview's proxy size switches to it. Its frames
+    must match the source's one to one, so the frame rate is kept"""
+    def __init__(self, ffCommand, filepath, v_source, size, fps, ow,
+                 threads=0, meta=None, projectDir=None):
+        OutputJob.__init__(self, ffCommand, v_source, "blender", ow, fps, threads, meta)
+        self.filepath = filepath
+        self.size = size
+        self.v_output = os.path.join(blenderProxyFolder(v_source, projectDir),
+                                     "proxy_%i.avi" % size)
+        self.format = "-c:v mjpeg -qscale:v 5 -pix_fmt yuvj420p -an"
+
+    def profile(self):
+        return " ".join(self.format.split() + ["-vf", "scale=" + self.scale()])
+
+    def scale(self):
+        # Percent of the source's size, kept even
+        return "trunc(iw*%i/200)*2:trunc(ih*%i/200)*2" % (self.size, self.size)
+
+    def mapArgs(self, label, threads):
+        return ["-map", label] + self.format.split() + threads + [self.v_partial]
+
+    def ffArgs(self):
+        threads = self.threadArgs()
+
+        args = [self.ffCommand, "-nostdin", "-hwaccel", "auto"] + threads
+        args += ["-i", self.input, "-vf", "scale=" + self.scale()]
+        args += self.format.split() + threads + ["-y", self.v_partial]
+
+        return args
+
+
+def stripProxyFolder(scene, s):
+    '''Returns the folder Blender reads the proxies of a movie strip from'''
+    ed = scene.sequence_editor
+    if ed.proxy_storage == 'PROJECT':
+        return blenderProxyFolder(stripFilepath(s), bpy.path.abspath(ed.proxy_dir))
+    elif s.use_proxy_custom_directory:
+        return blenderProxyFolder(stripFilepath(s), bpy.path.abspath(s.proxy.directory))
+    return blenderProxyFolder(stripFilepath(s))
+
+
+def enableBlenderProxies(scene, made):
+    '''Turns on Blender's proxies of the movie strips whose files got them.
+    made maps each source to the proxy sizes written for it'''
+    if not scene.sequence_editor:
+        return
+    for s in scene.sequence_editor.sequences_all:
+        if s.type != "MOVIE":
+            continue
+        sizes = made.get(stripFilepath(s))
+        if not sizes:
+            continue
+        s.use_proxy = True
+        for size in sizes:
+            setattr(s.proxy, "build_%i" % size, True)
+
+
+class MultiOutputSource(RevolverJob):
+    """Encodes several outputs of the same source (ie. proxy and intermediate)
+    from a single decode, splitting the decoded video inside FFMPEG"""
+    def __init__(self, sources):
+        first = sources[0]
+        RevolverJob.__init__(self, first.ffCommand, first.input, "multi",
+                             first.fps, first.threads, first.meta)
+        self.sources = sources
+        # Deinterlacing comes before the split, so it applies to every output
+        self.deinter = any(vs.deinter for vs in sources if isinstance(vs, VideoSource))
+
+    def outputs(self):
+        return self.sources
+
+    def ffArgs(self):
+        '''Builds one FFMPEG graph: decode (and deinterlace) once, split,
+        then scale and encode each output on its own'''
+        threads = self.threadArgs()
+
+        videos = [vs for vs in self.sources if vs.v_res != "audio"]
+        n = len(videos)
+        graph = "[0:v]%ssplit=%i%s" % ("yadif," if self.deinter else "", n,
+                                      "".join("[s%i]" % i for i in range(n)))
+        for i, vs in enumerate(videos):
+            graph += ";[s%i]scale=%s[v%i]" % (i, vs.scale(), i)
+
+        args = [self.ffCommand, "-nostdin", "-hwaccel", "auto"] + threads
+        args += ["-i", self.input, "-filter_complex", graph, "-y"]
+        for i, vs in enumerate(videos):
+            args += vs.mapArgs("[v%i]" % i, threads)
+        # WAV sidecars take the audio of the same demuxing
+        for vs in self.sources:
+            if vs.v_res == "audio":
+                args += vs.outputArgs()
+
+        return args
+
+
+######## ----------------------------------------------------------------------
+######## IMAGE PROXIES
+######## ----------------------------------------------------------------------
+
+
+# Image proxies are JPEGs named after their image plus this extension,
+# ie. frame_0001.exr.jpg, so the image they come from is never ambiguous
+image_proxy_ext = ".jpg"
+
 
-        print(callFFMPEG)
-        call(callFFMPEG, shell=False)
-        if os.path.exists(self.v_output):
+def imageProxyFolder(folder, root=None):
+    '''Returns the folder of the JPEG proxies of the images in folder:
+    folder_proxy beside it, or its mirror in the local proxy folder'''
+    proxyFolder = os.path.normpath(folder) + "_proxy"
+    if root:
+        return mirroredPath(root, proxyFolder)
+    return proxyFolder
+
+
+def imageSourceFolder(proxyFolder, root=None):
+    '''Returns the folder of the images whose proxies are in proxyFolder,
+    or None if it is not a folder of image proxies'''
+    folder = os.path.normpath(proxyFolder)
+    if root and unmirroredPath(root, folder):
+        folder = unmirroredPath(root, folder)
+    if not folder.endswith("_proxy"):
+        return None
+    return folder[:-len("_proxy")]
+
+
+def imageStripFolder(s):
+    '''Returns the absolute folder of the images of an IMAGE strip'''
+    return os.path.normpath(bpy.path.abspath(s.directory, library=s.id_data.library))
+
+
+def imageStripPaths(s):
+    '''Returns the absolute paths of the images of an IMAGE strip'''
+    folder = imageStripFolder(s)
+    return [os.path.join(folder, e.filename) for e in s.elements]
+
+
+def setImageStrip(s, folder, names):
+    '''Points an IMAGE strip to names inside folder, one per element,
+    keeping its directory relative if it was'''
+    s.directory = keepPathForm(s.directory, folder + os.sep)
+    for element, name in zip(s.elements, names):
+        element.filename = name
+
+
+def imageStripToProxy(s, index):
+    '''Points an IMAGE strip to the JPEG proxies of its images, if all of
+    them have one. Returns True if the strip changed'''
+    folder = imageStripFolder(s)
+    if imageSourceFolder(folder, index.root):
+        print("Strip '" + s.name + "' already uses image proxies.")
+        return False
+    proxies = index.imageProxiesFor(folder, [e.filename for e in s.elements])
+    if proxies is None:
+        print("No image proxies found for '" + s.name + "'.")
+        return False
+    setImageStrip(s, *proxies)
+    return True
+
+
+def imageStripToFullRes(s, index):
+    '''Points an IMAGE strip that uses JPEG proxies back to its images.
+    Returns True if the strip changed'''
+    folder = imageStripFolder(s)
+    if not imageSourceFolder(folder, index.root):
+        return False
+    images = index.imagesFor(folder, [e.filename for e in s.elements])
+    if images is None:
+        print("No full-res images found for '" + s.name + "'.")
+        return False
+    setImageStrip(s, *images)
+    return True
+
+
+class ImageProxy(OutputJob):
+    """A downscaled JPEG of one still or image sequence frame, so image
+    strips read a small file instead of a large EXR, DPX or TIFF"""
+    def __init__(self, ffCommand, image, width, ow, root=None):
+        OutputJob.__init__(self, ffCommand, image, "image", ow)
+        self.width = width
+
+        folder, name = os.path.split(image)
+        self.v_output = os.path.join(imageProxyFolder(folder, root),
+                                     name + image_proxy_ext)
+        self.format = "-frames:v 1 -update 1 -q:v 3"
+
+    def profile(self):
+        return " ".join(self.format.split() + ["-vf", "scale=" + self.scale()])
+
+    def scale(self):
+        # Never larger than the image itself; height keeps the aspect ratio
+        return "'min(iw,%i)':-2" % self.width
+
+    def mapArgs(self, label, threads):
+        return (["-map", label, "-vf", "scale=" + self.scale()]
+                + self.format.split() + [self.v_partial])
+
+    def ffArgs(self):
+        return ([self.ffCommand, "-nostdin", "-i", self.input, "-y"]
+                + self.mapArgs("0:v:0", []))
+
+    def cost(self):
+        return os.path.getsize(self.input)
+
+
+class ImageBatch(RevolverJob):
+    """Makes the proxies of several images of the same folder with one
+    FFMPEG, as starting one per frame would take longer than encoding"""
+    def __init__(self, images):
+        first = images[0]
+        RevolverJob.__init__(self, first.ffCommand, first.input, "images",
+                             meta={'duration': float(len(images))})
+        self.images = images
+
+    def outputs(self):
+        return self.images
+
+    def ffArgs(self):
+        args = [self.ffCommand, "-nostdin"]
+        for image in self.images:
+            args += ["-i", image.input]
+        args += ["-y"]
+        for i, image in enumerate(self.images):
+            args += image.mapArgs("%i:v:0" % i, [])
+        return args
+
+    def cost(self):
+        return sum(image.cost() for image in self.images)
+
+
+def batchImages(jobs, size=16):
+    '''Groups ImageProxy jobs of the same folder in ImageBatch jobs of
+    up to size images'''
+    byFolder = {}
+    for job in jobs:
+        byFolder.setdefault(os.path.dirname(job.input), []).append(job)
+    batches = []
+    for folder, images in sorted(byFolder.items()):
+        for i in range(0, len(images), size):
+            batch = images[i:i + size]
+            batches.append(batch[0] if len(batch) == 1 else ImageBatch(batch))
+    return batches
+
+
+######## ----------------------------------------------------------------------
+######## SEGMENTED ENCODING OF LONG SOURCES
+######## ----------------------------------------------------------------------
+
+
+def segmentPath(v_output, index):
+    '''Returns a hidden temporary file next to v_output for one segment'''
+    folder, name = os.path.split(v_output)
+    base, ext = os.path.splitext(name)
+    return os.path.join(folder, ".%s.seg%03i%s" % (base, index, ext))
+
+
+def keyframeCuts(ffprobe, path, duration, n):
+    '''Returns the start times of n segments of path, each one moved to
+    the first keyframe at or after its even share of duration'''
+    cuts = [0.0]
+    for i in range(1, n):
+        t = duration * i / n
+        try:
+            out = check_output([ffprobe, "-v", "error", "-select_streams", "v:0",
+                                "-skip_frame", "nokey", "-read_intervals",
+                                "%f%%+#1" % t, "-show_entries",
+                                "frame=best_effort_timestamp_time",
+                                "-of", "csv=p=0", path],
+                               universal_newlines=True)
+            t = float(out.split()[0].strip(","))
+        except (OSError, CalledProcessError, ValueError, IndexError):
+            pass
+        if cuts[-1] < t < duration:
+            cuts.append(t)
+    return cuts
+
+
+class SegmentJob(RevolverJob):
+    """Encodes one time range of a long source into temporary files"""
+    def __init__(self, parent, index, start_time, end_time):
+        if end_time is None:
+            duration = parent.meta.get('duration', 0.0) - start_time
+        else:
+            duration = end_time - start_time
+        RevolverJob.__init__(self, parent.ffCommand, parent.input, "segment",
+                             parent.fps, parent.threads,
+                             dict(parent.meta, duration=duration))
+        self.parent = parent
+        self.start_time = start_time
+        self.end_time = end_time
+        self.segments = [segmentPath(out.v_output, index) for out in parent.outputs()]
+
+    def ffArgs(self):
+        '''Runs the parent's FFMPEG command on a time range only. Seeking
+        before -i is fast, and exact when starting on a keyframe'''
+        # The parent job never runs by itself; it lends its command line
+        self.parent.threads = self.threads
+        args = self.parent.ffArgs()
+        seek = ["-ss", "%f" % self.start_time]
+        if self.end_time is not None:
+            seek += ["-t", "%f" % (self.end_time - self.start_time)]
+        i = args.index("-i")
+        args[i:i] = seek
+
+        for out, segment in zip(self.parent.outputs(), self.segments):
+            args[args.index(out.v_partial)] = segment
+        return args
+
+    def kill(self, proc):
+        RevolverJob.kill(self, proc)
+        for segment in self.segments:
+            if os.path.exists(segment):
+                os.remove(segment)
+
+    def finished(self, returncode):
+        if returncode == 0 and all(os.path.exists(seg) for seg in self.segments):
             return {'FINISHED'}
         else:
             return {'CANCELED'}
 
 
+class ConcatJob(RevolverJob):
+    """Joins the segments of one output with FFMPEG's concat demuxer,
+    copying streams without re-encoding"""
+    def __init__(self, out, segments, after):
+        RevolverJob.__init__(self, out.ffCommand, out.input, "concat",
+                             out.fps, 0, out.meta)
+        self.out = out
+        self.segments = segments
+        self.after = after
+        base, ext = os.path.splitext(segments[0])
+        self.listPath = base + ".txt"
+
+    def outputs(self):
+        return [self.out]
+
+    def cost(self):
+        # Stream copy; negligible next to encoding
+        return 0
+
+    def device(self):
+        # Segments are read from where they were written
+        return os.stat(os.path.dirname(self.out.v_output)).st_dev
+
+    def ffArgs(self):
+        return [self.ffCommand, "-nostdin", "-f", "concat", "-safe", "0",
+                "-i", self.listPath, "-map", "0", "-c", "copy",
+                "-y", self.out.v_partial]
+
+    def start(self):
+        with open(self.listPath, 'w') as listFile:
+            for segment in self.segments:
+                listFile.write("file '%s'\n" % segment.replace("'", "'\\''"))
+        return RevolverJob.start(self)
+
+    def finished(self, returncode):
+        self.cleanup()
+        return RevolverJob.finished(self, returncode)
+
+    def cleanup(self):
+        for path in self.segments + [self.listPath]:
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def splitJob(job, cuts):
+    '''Replaces job by segment jobs, one per cut, and the concat jobs
+    that join them into job's outputs'''
+    segments = [SegmentJob(job, i, start, end)
+                for i, (start, end) in enumerate(zip(cuts, cuts[1:] + [None]))]
+    concats = []
+    for n, out in enumerate(job.outputs()):
+        concats.append(ConcatJob(out, [seg.segments[n] for seg in segments], segments))
+    return segments + concats
+
+
+######## ----------------------------------------------------------------------
+######## PARALLEL JOBS
+######## ----------------------------------------------------------------------
+
+
+def parseTime(t):
+    '''Converts FFMPEG's HH:MM:SS.ms to seconds'''
+    try:
+        h, m, sec = t.strip().split(":")
+        return int(h) * 3600 + int(m) * 60 + float(sec)
+    except ValueError:
+        return 0.0
+
+
+class FFProgress(object):
+    """Reads the -progress output of a running FFMPEG in background threads"""
+    def __init__(self, fps, duration=0.0):
+        self.fps = fps
+        self.frame = 0
+        self.speed = 0.0
+        self.duration = duration
+        self.log = []
+        # Outcome of verify once the process ended, None until then
+        self.verified = None
+
+    def watch(self, proc, verify):
+        for target, args in ((self.readOutput, (proc, verify)),
+                             (self.readLog, (proc.stderr,))):
+            t = threading.Thread(target=target, args=args)
+            t.daemon = True
+            t.start()
+
+    def readOutput(self, proc, verify):
+        self.readProgress(proc.stdout)
+        # Output ends with the process; checking what it wrote here keeps
+        # ffprobe off the UI thread
+        returncode = proc.wait()
+        try:
+            self.verified = verify(returncode)
+        except Exception as e:
+            print("Could not check the outputs: " + repr(e))
+            self.verified = False
+
+    def ended(self):
+        '''Tells if the process ended and its outputs were checked'''
+        return self.verified is not None
+
+    def readProgress(self, pipe):
+        for line in pipe:
+            key, sep, value = line.strip().partition("=")
+            if key == "frame":
+                self.frame = int(value)
+            elif key == "fps":
+                self.speed = float(value)
+            elif key in ("out_time_us", "out_time_ms") and value.isdigit():
+                # Both are in microseconds. Audio-only outputs report
+                # no frames, so their progress is counted from time
+                self.frame = max(self.frame, int(int(value) / 1000000.0 * self.fps))
+
+    def readLog(self, pipe):
+        for line in pipe:
+            # Without ffprobe data, source duration is only known from
+            # FFMPEG's input description
+            if not self.duration and line.strip().startswith("Duration:"):
+                self.duration = parseTime(line.split(",")[0].split(": ")[1])
+            # Keep the tail of FFMPEG's log to print it if the job fails
+            self.log = self.log[-19:] + [line]
+
+    def totalFrames(self):
+        return int(self.duration * self.fps)
+
+    def fraction(self):
+        '''Returns how much of the job is done, from 0.0 to 1.0'''
+        total = self.totalFrames()
+        if not total:
+            return 0.0
+        return min(1.0, self.frame / total)
+
+
+def autoJobs(n_jobs, n_sources):
+    '''Returns how many FFMPEGs to run at once and how many threads each one
+    gets, so that together they do not oversubscribe the CPU'''
+    cores = os.cpu_count() or 1
+    if n_jobs <= 0:
+        # A single FFMPEG rarely scales past 4 threads for intra-frame
+        # codecs, so "auto" fills the machine with 4-thread jobs
+        n_jobs = max(1, cores // 4)
+    n_jobs = max(1, min(n_jobs, n_sources))
+    threads = max(1, cores // n_jobs)
+
+    return n_jobs, threads
+
+
+# Rungs of the proxy ladder, in percent of the proxy size. The full size
+# rung keeps the plain "_proxy" suffix
+proxy_rungs = (100, 50, 25)
+
+
+def rungSuffix(rung):
+    '''Returns the suffix of the proxy files of a ladder rung'''
+    if rung == 100:
+        return "_proxy"
+    return "_proxy%i" % rung
+
+
+def proxyRung(path):
+    '''Returns the ladder rung of a proxy file, or None if path is not
+    a proxy'''
+    base = os.path.splitext(path)[0]
+    for rung in proxy_rungs:
+        if base.endswith(rungSuffix(rung)):
+            return rung
+    return None
+
+
+# Suffix of the WAV sidecars holding the audio of a source. Plain "_audio"
+# is too common in recorder and camera file names
+audio_suffix = "_revolver_audio"
+
+
+def isSidecar(path):
+    '''Tells if path is a WAV sidecar written by Revolver. Files that only
+    look like one, but Revolver did not write, are user media'''
+    base, ext = os.path.splitext(os.path.normpath(path))
+    return ext.lower() == ".wav" and base.endswith(audio_suffix) and \
+        os.path.normpath(path) in getManifest().entries
+
+
+# Suffixes Revolver appends to the names of the files it writes
+variant_suffixes = tuple(rungSuffix(rung) for rung in proxy_rungs) + \
+                   ("_PRORES", "_MJPEG", "_h264", audio_suffix)
+
+
+def sourceBase(path):
+    '''Returns path without extension and without Revolver's suffix: the
+    name shared by a source and every file made from it'''
+    base = os.path.splitext(os.path.normpath(path))[0]
+    for suffix in variant_suffixes:
+        if base.endswith(suffix):
+            return base[:-len(suffix)]
+    return base
+
+
+def jobOrder(order, priority=()):
+    '''Returns a sort key for jobs. Jobs of sources whose sourceBase() is
+    in priority come first, then jobs are sorted by name or by cost'''
+    def key(job):
+        first = sourceBase(job.input) not in priority
+        if order == 'SHORTEST':
+            return (first, job.cost())
+        elif order == 'LONGEST':
+            return (first, -job.cost())
+        else:  # order == 'NAME'
+            return (first, job.input)
+    return key
+
+
+def isRotational(device):
+    '''Tells if a device is a spinning disk. Only Linux says so; anything
+    else (and network mounts) counts as not rotational'''
+    # os.major() and os.minor() only exist on POSIX systems
+    if not hasattr(os, "major"):
+        return False
+    sysPath = "/sys/dev/block/%i:%i" % (os.major(device), os.minor(device))
+    # Partitions keep their disk's queue settings one folder up
+    for folder in (sysPath, os.path.join(sysPath, "..")):
+        try:
+            with open(os.path.join(folder, "queue", "rotational")) as f:
+                return f.read().strip() == "1"
+        except OSError:
+            pass
+    return False
+
+
+class DeviceLimits(object):
+    """How many jobs may read from each storage device at the same time,
+    apart from how many jobs the CPU can take"""
+    def __init__(self, default, perMount=""):
+        # 0 means automatic: 2 reads on spinning disks, unlimited elsewhere
+        self.default = default
+        self.perDevice = {}
+        # perMount is written as "/mnt/raid=1, /media/nvme=8"
+        for entry in perMount.split(","):
+            mount, sep, limit = entry.strip().rpartition("=")
+            if not mount:
+                continue
+            try:
+                self.perDevice[os.stat(mount).st_dev] = int(limit)
+            except (OSError, ValueError):
+                print("Ignoring I/O limit '" + entry.strip() + "'.")
+
+    def limit(self, device):
+        '''Returns the number of concurrent reads allowed, 0 for no limit'''
+        if device not in self.perDevice:
+            if self.default:
+                self.perDevice[device] = self.default
+            elif isRotational(device):
+                self.perDevice[device] = 2
+            else:
+                self.perDevice[device] = 0
+        return self.perDevice[device]
+
+
+class RevolverPool(object):
+    """Runs RevolverJobs as concurrent FFMPEG processes, n_jobs at a time"""
+    def __init__(self, jobs, n_jobs, key=None, limits=None):
+        self.key = key
+        self.pending = sorted(jobs, key=key)
+        self.running = []
+        self.done = []
+        self.failed = []
+        self.n_jobs = n_jobs
+        self.limits = limits
+        self.total = len(self.pending)
+        self.started = time.time()
+
+    def add(self, jobs):
+        '''Queues more jobs, keeping pending jobs in order'''
+        if jobs:
+            self.pending = sorted(self.pending + jobs, key=self.key)
+            self.total += len(jobs)
+
+    def poll(self):
+        '''Collects finished processes and starts pending jobs in the free
+        slots. Returns False when there is nothing left to run'''
+        for job, proc in self.running[:]:
+            returncode = proc.poll()
+            if returncode is not None and job.progress.ended():
+                self.running.remove((job, proc))
+                if job.finished(returncode) == {'CANCELED'}:
+                    print("".join(job.progress.log))
+                    self.failed.append(job)
+                else:
+                    self.done.append(job)
+
+        reading = {}
+        for job, proc in self.running:
+            reading[job.device()] = reading.get(job.device(), 0) + 1
+
+        for job in self.pending[:]:
+            if len(self.running) >= self.n_jobs:
+                break
+            if any(dep in self.failed for dep in job.after):
+                self.pending.remove(job)
+                job.cleanup()
+                self.failed.append(job)
+            elif all(dep in self.done for dep in job.after):
+                # A busy device holds back its own jobs only; jobs reading
+                # from other devices still take the free slots
+                device = job.device()
+                if self.limits:
+                    limit = self.limits.limit(device)
+                    if limit and reading.get(device, 0) >= limit:
+                        continue
+                self.pending.remove(job)
+                self.running.append((job, job.start()))
+                reading[device] = reading.get(device, 0) + 1
+
+        return bool(self.pending or self.running)
+
+    def cancel(self):
+        '''Kills running FFMPEGs and drops pending jobs'''
+        for job, proc in self.running:
+            job.kill(proc)
+            self.failed.append(job)
+        for job in self.pending:
+            job.cleanup()
+        self.running = []
+        self.pending = []
+
+    def fraction(self):
+        '''Returns how much of all jobs is done, from 0.0 to 1.0, counting
+        the frames already encoded by running jobs'''
+        if not self.total:
+            return 1.0
+        done = len(self.done) + len(self.failed)
+        done += sum(job.progress.fraction() for job, proc in self.running)
+        return done / self.total
+
+    def progress(self):
+        '''Returns finished jobs as a percentage of all jobs'''
+        return int(100 * self.fraction())
+
+    def status(self):
+        '''Returns a one-line summary: frames, encoding speed and ETA'''
+        frames = sum(job.progress.frame for job, proc in self.running)
+        total = sum(job.progress.totalFrames() for job, proc in self.running)
+        speed = sum(job.progress.speed for job, proc in self.running)
+        fraction = self.fraction()
+        if fraction > 0:
+            eta = (time.time() - self.started) * (1 - fraction) / fraction
+            eta = "%i:%02i" % divmod(int(eta), 60)
+        else:
+            eta = "--:--"
+
+        return "Velvet Revolver: %i/%i jobs | %i/%i frames | %.1f fps | ETA %s | ESC to cancel" \
+               % (len(self.done) + len(self.failed), self.total,
+                  frames, total, speed, eta)
+
+
+######## ----------------------------------------------------------------------
+######## FOLDER SCANNING
+######## ----------------------------------------------------------------------
+
+
+def splitPatterns(patterns):
+    '''Splits "*.MTS, PRIVATE/*" into lowercase glob patterns'''
+    return [p.strip().lower() for p in patterns.split(",") if p.strip()]
+
+
+def matchesAny(relPath, patterns):
+    '''Matches a path relative to the scanned folder, or just its name,
+    against glob patterns, ignoring case'''
+    relPath = relPath.lower()
+    name = relPath.rsplit("/", 1)[-1]
+    return any(fnmatch.fnmatchcase(relPath, p) or fnmatch.fnmatchcase(name, p)
+               for p in patterns)
+
+
+def scanSources(folder, recursive=True, maxDepth=0, include="", exclude="",
+                images=False):
+    '''Yields the video sources inside folder as soon as they are found,
+    and its images (stills and image sequences) if images is set.
+    maxDepth 0 means no limit, 1 only folder itself. Hidden files and
+    folders, and files written by Revolver, are never sources'''
+    includes = splitPatterns(include)
+    excludes = splitPatterns(exclude)
+    extensions = bpy.path.extensions_movie
+    if images:
+        extensions = extensions | bpy.path.extensions_image
+    stack = [(folder, 1)]
+
+    while stack:
+        path, depth = stack.pop()
+        try:
+            entries = sorted(os.scandir(path), key=lambda e: e.name)
+        except OSError as e:
+            print("Could not scan '" + path + "': " + str(e))
+            continue
+
+        subfolders = []
+        for entry in entries:
+            if entry.name.startswith("."):
+                continue
+            relPath = os.path.relpath(entry.path, folder).replace(os.sep, "/")
+
+            if entry.is_dir():
+                # Blender's own proxies and image proxies are not sources either
+                if entry.name == "BL_proxy":
+                    continue
+                if entry.name.endswith("_proxy") and \
+                   os.path.isdir(entry.path[:-len("_proxy")]):
+                    continue
+                if recursive and (not maxDepth or depth < maxDepth) \
+                   and not matchesAny(relPath, excludes):
+                    subfolders.append((entry.path, depth + 1))
+
+            elif entry.is_file():
+                base, ext = os.path.splitext(entry.path)
+                if ext.lower() not in extensions:
+                    continue
+                # Proxies and intermediates are not sources. TO-DO: allow the
+                # creation of proxies from a _PRORES or _MJPEG file when
+                # there is no "original" file (ie. without _PRORES) beside it.
+                if sourceBase(entry.path) != os.path.normpath(base):
+                    continue
+                if includes and not matchesAny(relPath, includes):
+                    continue
+                if matchesAny(relPath, excludes):
+                    continue
+                yield entry.path
+
+        # Depth-first, in name order, so card folders are encoded together
+        stack.extend(reversed(subfolders))
+
+
+class SourceScanner(threading.Thread):
+    """Scans for sources in the background and turns them into jobs in
+    small batches, so encoding starts while a large tree is still scanned"""
+    def __init__(self, sources, builder, batch=8):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.sources = sources
+        self.builder = builder
+        self.batch = batch
+        self.found = 0
+        self.stopped = False
+        # What stopped the scan (ie. an unreadable share), if anything
+        self.error = None
+        self.jobs = queue.Queue()
+
+    def run(self):
+        try:
+            try:
+                self.scan()
+            finally:
+                self.builder.save()
+        except Exception as e:
+            print("Velvet Revolver stopped scanning: " + repr(e))
+            self.error = e
+
+    def scan(self):
+        batch = []
+        saved = time.time()
+        for source in self.sources:
+            if self.stopped:
+                return
+            batch.append(source)
+            self.found += 1
+            if len(batch) >= self.batch:
+                self.jobs.put(self.builder.build(batch))
+                batch = []
+                # Caches are also written now and then, in case Blender
+                # quits before a long scan ends
+                if time.time() - saved > 30:
+                    self.builder.save()
+                    saved = time.time()
+        if batch and not self.stopped:
+            self.jobs.put(self.builder.build(batch))
+
+    def stop(self):
+        self.stopped = True
+
+    def take(self):
+        '''Returns the jobs made since the last call'''
+        jobs = []
+        while True:
+            try:
+                jobs += self.jobs.get_nowait()
+            except queue.Empty:
+                return jobs
+
+
+######## ----------------------------------------------------------------------
+######## BAKED STRIPS
+######## ----------------------------------------------------------------------
+
+
+def bakeFolder():
+    '''Returns the folder of the baked strips of the open .blend file:
+    Revolver_bakes beside it, or its mirror in the local proxy folder'''
+    folder = os.path.join(os.path.dirname(bpy.data.filepath), "Revolver_bakes")
+    root = getProxyRoot()
+    if root:
+        return mirroredPath(root, folder)
+    return folder
+
+
+def bakePath(s, key):
+    '''Returns the movie a strip is baked to while its key stays the same'''
+    return os.path.join(bakeFolder(), "%s_%s.mov" % (bpy.path.clean_name(s.name), key))
+
+
+# Properties that change nothing in the pixels of a strip; moving a strip
+# moves its bake along instead of making it out of date
+unhashed = {"rna_type", "select", "select_left_handle", "select_right_handle",
+            "mute", "lock", "show_expanded", "channel", "frame_start",
+            "frame_final_start", "frame_final_end"}
+
+
+def animatedPaths(idblock):
+    '''Returns the data paths F-Curves animate in idblock. Their values
+    follow the current frame; actionValues hashes their keyframes instead'''
+    anim = getattr(idblock, "animation_data", None)
+    if anim is None or anim.action is None:
+        return set()
+    return {fc.data_path for fc in anim.action.fcurves}
+
+
+def dataPath(struct, identifier):
+    '''Returns the data path of a property of struct from its datablock'''
+    try:
+        base = struct.path_from_id()
+    except ValueError:
+        return None
+    return base + "." + identifier if base else identifier
+
+
+def rnaValues(struct, depth=0, animated=None):
+    '''Returns the names and values of the RNA properties of struct (ie. a
+    modifier's or a camera's settings), ready to be hashed. Datablocks
+    count by name; other pointers and collections (ie. the points of a
+    Curves modifier) are followed depth levels down. Animated properties
+    are left out'''
+    if animated is None:
+        animated = animatedPaths(struct.id_data)
+    values = []
+    for prop in struct.bl_rna.properties:
+        if prop.identifier in unhashed:
+            continue
+        if animated and dataPath(struct, prop.identifier) in animated:
+            continue
+        value = getattr(struct, prop.identifier, None)
+        if prop.type == 'COLLECTION':
+            if not depth:
+                continue
+            value = [rnaValues(item, depth - 1, animated) for item in value]
+        elif prop.type == 'POINTER':
+            if value is None or not depth or isinstance(value, bpy.types.ID):
+                value = getattr(value, "name", None)
+            else:
+                value = rnaValues(value, depth - 1, animated)
+        elif hasattr(value, "__len__") and not isinstance(value, str):
+            value = tuple(value)
+        values.append((prop.identifier, value))
+    return values
+
+
+def actionValues(anim, path=""):
+    '''Returns the keyframes of the action of an AnimData, ready to be
+    hashed; only those of F-Curves whose data path has path in it'''
+    if anim is None or anim.action is None:
+        return None
+    return [(fc.data_path, fc.array_index,
+             [tuple(k.co) + tuple(k.handle_left) + tuple(k.handle_right)
+              for k in fc.keyframe_points])
+            for fc in anim.action.fcurves if path in fc.data_path]
+
+
+# How to compute the key of each kind of baked strip; filled below
+bake_keys = {}
+
+
+def stripChain(s):
+    '''Returns s and every strip whose pixels it uses: inputs of effects,
+    and strips used as masks by its modifiers'''
+    chain = []
+    todo = [s]
+    while todo:
+        strip = todo.pop()
+        if strip is None or strip in chain:
+            continue
+        chain.append(strip)
+        for attr in ("input_1", "input_2", "input_3"):
+            todo.append(getattr(strip, attr, None))
+        for modifier in strip.modifiers:
+            todo.append(getattr(modifier, "input_mask_strip", None))
+    return chain
+
+
+def frozenStripKey(s):
+    '''Hashes what the pixels of a strip and its chain depend on: the size
+    and frame rate of the edit they are rendered at, their settings,
+    modifiers (with their curves and colours), animation, source files and
+    images, and the scenes of SCENE strips'''
+    scene = s.id_data
+    r = scene.render
+    animated = animatedPaths(scene)
+    h = hashlib.sha1(repr((r.resolution_x, r.resolution_y, r.resolution_percentage,
+                           r.pixel_aspect_x, r.pixel_aspect_y,
+                           r.fps, r.fps_base)).encode())
+    for strip in stripChain(s):
+        h.update(repr(rnaValues(strip, 4, animated)).encode())
+        h.update(repr(actionValues(scene.animation_data, '["%s"]' % strip.name)).encode())
+        if strip.type in {"MOVIE", "SOUND"}:
+            paths = [stripFilepath(strip)]
+        elif strip.type == "IMAGE":
+            paths = imageStripPaths(strip)
+        else:
+            paths = []
+        for path in paths:
+            try:
+                h.update(fileKey(path).encode())
+            except OSError:
+                pass
+        if strip.type == "SCENE" and strip.scene:
+            h.update(repr(sceneValues(strip)).encode())
+    return h.hexdigest()[:16]
+
+
+def freeChannel(ed, s):
+    '''Returns the first channel above s that is free over its whole range,
+    or None if there is none'''
+    channel = s.channel + 1
+    while channel <= 32:
+        if not any(o.channel == channel and o.frame_final_start < s.frame_final_end
+                   and o.frame_final_end > s.frame_final_start for o in ed.sequences):
+            return channel
+        channel += 1
+    return None
+
+
+def applyBake(ed, s, path):
+    '''Plays the baked movie at path over strip s, muting s, if it exists.
+    Otherwise s plays live again'''
+    baked = ed.sequences_all.get(s.get("revolver_baked", ""))
+
+    if os.path.isfile(path):
+        if baked is None:
+            channel = freeChannel(ed, s)
+            if channel is None:
+                print("No free channel above '" + s.name + "' for its bake.")
+                return
+            baked = ed.sequences.new_movie(name=s.name + " baked", filepath=path,
+                                           channel=channel, frame_start=s.frame_final_start)
+            baked.blend_type = s.blend_type
+            baked.blend_alpha = s.blend_alpha
+            baked["revolver_bake_of"] = s.name
+            s["revolver_baked"] = baked.name
+        elif stripFilepath(baked) != os.path.normpath(path):
+            setStripFilepath(baked, path)
+        if baked.frame_start != s.frame_final_start:
+            baked.frame_start = s.frame_final_start
+        if baked.mute or not s.mute:
+            baked.mute = False
+            s.mute = True
+
+    elif baked is not None and not baked.mute:
+        print("'" + s.name + "' changed since it was baked; it plays live now.")
+        baked.mute = True
+        s.mute = False
+
+
+def revertBake(ed, s):
+    '''Removes the bake laid over s and plays s live for good'''
+    baked = ed.sequences_all.get(s.get("revolver_baked", ""))
+    if baked is not None:
+        ed.sequences.remove(baked)
+    s.mute = False
+    for key in ("revolver_bake", "revolver_baked"):
+        if key in s:
+            del s[key]
+
+
+# Set when something changed that keys of baked strips may depend on
+bakes_changed = True
+
+
+@persistent
+def bakesChanged(*args):
+    '''depsgraph_update_post and load_post handler: keys of baked strips
+    are computed again on the next check'''
+    global bakes_changed
+    bakes_changed = True
+
+
+def checkBakes():
+    '''Timer callback: points each baked strip at the bake of its current
+    key, so a change in its source brings the live strip back and undoing
+    the change brings the bake back. Keys are only computed after a
+    change, as hashing a whole scene takes a while'''
+    global bakes_changed
+    if not bakes_changed or not bpy.data.filepath:
+        return 2.0
+    bakes_changed = False
+    for scene in bpy.data.scenes:
+        ed = scene.sequence_editor
+        if not ed:
+            continue
+        for s in ed.sequences:
+            kind = s.get("revolver_bake")
+            if kind in bake_keys:
+                applyBake(ed, s, bakePath(s, bake_keys[kind](s)))
+    return 2.0
+
+
+class BlenderProgress(FFProgress):
+    """Reads the output of a background Blender rendering a movie"""
+    def readProgress(self, pipe):
+        started = time.time()
+        for line in pipe:
+            # Printed once each frame is in the movie
+            if line.startswith("Append frame"):
+                self.frame += 1
+                self.speed = self.frame / max(0.001, time.time() - started)
+            self.log = self.log[-19:] + [line]
+
+
+class BlenderRender(OutputJob):
+    """Renders frames of a scene to a PNG QuickTime (intra-frame, with alpha)
+    in a background Blender, from a copy of the open .blend file"""
+    def __init__(self, blendCopy, scene, frame_start, frame_end, output, threads=0):
+        fps = scene.render.fps / scene.render.fps_base
+        OutputJob.__init__(self, bpy.app.binary_path, blendCopy, "render", True, fps,
+                           threads, {'duration': (frame_end - frame_start + 1) / fps})
+        self.v_output = output
+        self.scene = scene.name
+        self.frame_start = frame_start
+        self.frame_end = frame_end
+
+    def profile(self):
+        return "render %s %i-%i" % (self.scene, self.frame_start, self.frame_end)
+
+    def setup(self):
+        '''Returns Python run in the background Blender before rendering'''
+        return ""
+
+    def ffArgs(self):
+        # Blender keeps an output name that already has the extension
+        settings = ("import bpy\n"
+                    "scene = bpy.context.scene\n"
+                    + self.setup() +
+                    "r = scene.render\n"
+                    "r.filepath = %r\n"
+                    "r.use_file_extension = True\n"
+                    "r.image_settings.file_format = 'FFMPEG'\n"
+                    "r.image_settings.color_mode = 'RGBA'\n"
+                    "r.ffmpeg.format = 'QUICKTIME'\n"
+                    "r.ffmpeg.codec = 'PNG'\n"
+                    "r.ffmpeg.audio_codec = 'NONE'\n"
+                    % self.v_partial)
+        args = [self.ffCommand, "-b", self.input, "-S", self.scene,
+                "--python-expr", settings]
+        if self.threads:
+            args += ["-t", str(self.threads)]
+        args += ["-s", str(self.frame_start), "-e", str(self.frame_end), "-a"]
+        return args
+
+    def start(self):
+        args = self.ffArgs()
+        self.progress = BlenderProgress(self.fps, self.meta['duration'])
+        proc = Popen(args, stdout=PIPE, stderr=PIPE, universal_newlines=True)
+        self.progress.watch(proc, self.verify)
+        return proc
+
+    def complete(self):
+        return os.path.isfile(self.v_partial) and os.path.getsize(self.v_partial) > 0
+
+    def cost(self):
+        return self.frame_end - self.frame_start + 1
+
+
+class StripRender(BlenderRender):
+    """Renders a strip with its modifiers and effect chain, and nothing else
+    of the timeline, over a transparent background"""
+    def __init__(self, blendCopy, s, output, threads=0):
+        BlenderRender.__init__(self, blendCopy, s.id_data, s.frame_final_start,
+                               s.frame_final_end - 1, output, threads)
+        self.strip = s.name
+
+    def setup(self):
+        # Effect inputs and mask strips are read even when muted, and any
+        # of them left playing would be drawn over the strip. The strip's
+        # own blending is applied again by the baked movie
+        return ("for s in scene.sequence_editor.sequences_all:\n"
+                "    s.mute = True\n"
+                "top = scene.sequence_editor.sequences_all[%r]\n"
+                "top.mute = False\n"
+                "top.blend_type = 'REPLACE'\n"
+                "top.blend_alpha = 1.0\n"
+                "scene.render.use_sequencer = True\n"
+                "scene.render.use_compositing = False\n"
+                % self.strip)
+
+
+class BakeModal(object):
+    """Runs BlenderRender jobs in the background for the bake operators,
+    and lays the bakes over their strips when done"""
+    def startBakes(self, context, todo):
+        '''Renders (strip, movie, job maker) in todo; returns the operator's
+        result'''
+        ed = context.scene.sequence_editor
+        for s, path, makeJob in todo[:]:
+            if os.path.isfile(path):
+                applyBake(ed, s, path)
+                todo.remove((s, path, makeJob))
+        if not todo:
+            self.report({'INFO'}, "Strips are baked.")
+            return {'FINISHED'}
+
+        folder = bakeFolder()
+        os.makedirs(folder, exist_ok=True)
+        # Background Blenders read a copy of the file as it is now; one
+        # per run, as scene bakes and freezes may run at the same time
+        fd, self._copy = tempfile.mkstemp(prefix=".bake_", suffix=".blend", dir=folder)
+        os.close(fd)
+        bpy.ops.wm.save_as_mainfile(filepath=self._copy, copy=True)
+
+        n_jobs, threads = autoJobs(self.prop_jobs, len(todo))
+        self._pool = RevolverPool([makeJob(self._copy, s, path, threads)
+                                   for s, path, makeJob in todo], n_jobs,
+                                  key=lambda job: -job.cost())
+
+        wm = context.window_manager
+        wm.progress_begin(0, 100)
+        self._timer = wm.event_timer_add(0.5, window=context.window)
+        wm.modal_handler_add(self)
+
+        return {'RUNNING_MODAL'}
+
+    def modal(self, context, event):
+        pool = self._pool
+
+        if event.type == 'ESC':
+            pool.cancel()
+            self.finish(context)
+            self.report({'WARNING'}, "Baking cancelled.")
+            return {'CANCELLED'}
+
+        if event.type == 'TIMER':
+            if pool.poll():
+                context.window_manager.progress_update(pool.progress())
+                context.workspace.status_text_set(pool.status())
+            else:
+                self.finish(context)
+                bakesChanged()
+                checkBakes()
+                if pool.failed:
+                    print("Some strips were not baked. Look above for more info.")
+                else:
+                    self.report({'INFO'}, "Strips baked.")
+                return {'FINISHED'}
+
+        return {'PASS_THROUGH'}
+
+    def finish(self, context):
+        manifest = getManifest()
+        for job in self._pool.done:
+            manifest.record(job)
+        manifest.save()
+        if os.path.exists(self._copy):
+            os.remove(self._copy)
+
+        wm = context.window_manager
+        wm.event_timer_remove(self._timer)
+        wm.progress_end()
+        context.workspace.status_text_set(None)
+
+    def cancel(self, context):
+        self._pool.cancel()
+        self.finish(context)
+
+
+class Revolver_Revert_Bakes(bpy.types.Operator):
+    """Remove the bakes of the selected strips and play them live again"""
+    bl_idname = "sequencer.revolver_revert_bakes"
+    bl_label = "Revert Baked Strips"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    @classmethod
+    def poll(cls, context):
+        return context.scene.sequence_editor is not None
+
+    def execute(self, context):
+        ed = context.scene.sequence_editor
+        # Names first: reverting removes baked movies, which may be
+        # selected too
+        names = set()
+        for s in ed.sequences:
+            if not s.select:
+                continue
+            # Selecting the baked movie reverts the strip it stands for
+            names.add(s.get("revolver_bake_of", s.name))
+        reverted = 0
+        for name in names:
+            s = ed.sequences_all.get(name)
+            if s is not None and "revolver_bake" in s:
+                revertBake(ed, s)
+                reverted += 1
+        self.report({'INFO'}, "%i strips play live again." % reverted)
+        return {'FINISHED'}
+
+
+######## ----------------------------------------------------------------------
+######## BAKED SCENE STRIPS
+######## ----------------------------------------------------------------------
+
+
+def sceneRange(s):
+    '''Returns the first and last frames of its scene a SCENE strip shows'''
+    start = s.scene.frame_start + s.frame_final_start - s.frame_start
+    return start, start + s.frame_final_duration - 1
+
+
+# Transform channels of objects; the matrices follow the current frame
+object_transform = ("location", "rotation_mode", "rotation_euler",
+                    "rotation_quaternion", "rotation_axis_angle", "scale",
+                    "delta_location", "delta_rotation_euler",
+                    "delta_rotation_quaternion", "delta_scale")
+
+
+def sceneValues(s):
+    '''Returns what the frames shown by a SCENE strip depend on, ready to
+    be hashed: range, render settings, camera, world, and each object's
+    transform, data, constraints, modifiers, materials and animation.
+    Mesh geometry counts by vertex count only, so that checking a large
+    scene stays quick'''
+    scene = s.scene
+    values = []
+
+    def add(*value):
+        values.append(value)
+
+    r = scene.render
+    camera = s.scene_camera or scene.camera
+    add(scene.name, sceneRange(s), r.engine, r.resolution_x, r.resolution_y,
+        r.resolution_percentage, r.fps, r.fps_base, r.film_transparent,
+        camera.name if camera else None)
+    if scene.world:
+        add(rnaValues(scene.world), actionValues(scene.world.animation_data))
+
+    for ob in sorted(scene.objects, key=lambda o: o.name):
+        animated = animatedPaths(ob)
+        add(ob.name, ob.type, ob.hide_render, ob.parent.name if ob.parent else None,
+            [(prop, repr(getattr(ob, prop))) for prop in object_transform
+             if prop not in animated],
+            actionValues(ob.animation_data))
+        if ob.data:
+            add(ob.data.name, rnaValues(ob.data), actionValues(ob.data.animation_data))
+            if ob.type == 'MESH':
+                add(len(ob.data.vertices))
+        for constraint in ob.constraints:
+            add(rnaValues(constraint, 0, animated))
+        for modifier in ob.modifiers:
+            add(rnaValues(modifier, 0, animated))
+        for slot in ob.material_slots:
+            material = slot.material
+            if material is None:
+                continue
+            add(material.name, rnaValues(material), actionValues(material.animation_data))
+            if material.node_tree:
+                tree = material.node_tree
+                animated = animatedPaths(tree)
+                for node in tree.nodes:
+                    add(node.name, [tuple(i.default_value) if hasattr(i.default_value, "__len__")
+                                    else i.default_value
+                                    for i in node.inputs if hasattr(i, "default_value")
+                                    and dataPath(i, "default_value") not in animated])
+                add(actionValues(tree.animation_data))
+    return values
+
+
+# SCENE strips are keyed like frozen strips; their chain holds the scene
+bake_keys['SCENE'] = frozenStripKey
+
+
+class Revolver_Bake_Scenes(BakeModal, bpy.types.Operator):
+    """Render SCENE strips to movies in background Blenders, and play those until their scenes change"""
+    bl_idname = "sequencer.revolver_bake_scenes"
+    bl_label = "Bake Scene Strips"
+
+    prop_scope: EnumProperty(
+        name="Strips",
+        default='SELECTED',
+        items=toggle_scopes,
+    )
+    prop_channels: StringProperty(
+        name="Channels",
+        description="Channels to bake, as in 1, 3-5",
+        default="",
+    )
+    prop_jobs: IntProperty(
+        name="Parallel Jobs",
+        description="How many Blenders to run at the same time (0 = automatic, based on CPU cores)",
+        default=0,
+        min=0,
+    )
+
+    @classmethod
+    def poll(cls, context):
+        return context.scene.sequence_editor is not None
+
+    def execute(self, context):
+        if not bpy.data.filepath:
+            self.report({'ERROR'}, "Save the .blend file first; bakes are kept beside it.")
+            return {'CANCELLED'}
+
+        scene = context.scene
+        ed = scene.sequence_editor
+        # Only top-level strips: the baked movie is laid over the strip.
+        # Strips render through the sequencer, so that their modifiers,
+        # crop, transform, colour, strobe and reverse are baked too
+        todo = []
+        for s in scopedStrips(scene, self.prop_scope, self.prop_channels):
+            if s.type == "SCENE" and s.scene and s.scene != scene \
+               and ed.sequences.get(s.name) == s:
+                s["revolver_bake"] = 'SCENE'
+                todo.append((s, bakePath(s, frozenStripKey(s)), StripRender))
+
+        return self.startBakes(context, todo)
+
+
+######## ----------------------------------------------------------------------
+######## FROZEN STRIPS
+######## ----------------------------------------------------------------------
+
+
+bake_keys['FREEZE'] = frozenStripKey
+
+
+class Revolver_Freeze_Strips(BakeModal, bpy.types.Operator):
+    """Bake strips with modifiers or effects to movies in background Blenders, and play those until their settings change"""
+    bl_idname = "sequencer.revolver_freeze"
+    bl_label = "Freeze Strips"
+
+    prop_scope: EnumProperty(
+        name="Strips",
+        default='SELECTED',
+        items=toggle_scopes,
+    )
+    prop_channels: StringProperty(
+        name="Channels",
+        description="Channels to freeze, as in 1, 3-5",
+        default="",
+    )
+    prop_jobs: IntProperty(
+        name="Parallel Jobs",
+        description="How many Blenders to run at the same time (0 = automatic, based on CPU cores)",
+        default=0,
+        min=0,
+    )
+
+    @classmethod
+    def poll(cls, context):
+        return context.scene.sequence_editor is not None
+
+    def execute(self, context):
+        if not bpy.data.filepath:
+            self.report({'ERROR'}, "Save the .blend file first; bakes are kept beside it.")
+            return {'CANCELLED'}
+
+        scene = context.scene
+        ed = scene.sequence_editor
+        # Strips with something to evaluate on every frame; baked movies
+        # and sounds have nothing
+        todo = []
+        for s in scopedStrips(scene, self.prop_scope, self.prop_channels):
+            if s.type == "SOUND" or "revolver_bake_of" in s \
+               or ed.sequences.get(s.name) != s:
+                continue
+            # A scene cannot render inside itself
+            if s.type == "SCENE" and s.scene in (None, scene):
+                continue
+            if len(s.modifiers) or hasattr(s, "input_1"):
+                s["revolver_bake"] = 'FREEZE'
+                todo.append((s, bakePath(s, frozenStripKey(s)), StripRender))
+
+        return self.startBakes(context, todo)
+
+
+def bakeEntry(self, context):
+    self.layout.separator()
+    self.layout.operator(Revolver_Bake_Scenes.bl_idname)
+    self.layout.operator(Revolver_Freeze_Strips.bl_idname)
+    self.layout.operator(Revolver_Revert_Bakes.bl_idname)
+
+
 ######## ----------------------------------------------------------------------
 ######## VELVET REVOLVER MAIN CLASS
 ######## ----------------------------------------------------------------------
 
+class JobBuilder(object):
+    """Turns sources into Revolver jobs. It runs in the scanning thread, so
+    it keeps plain copies of the operator's settings"""
+    def __init__(self, op, ffCommand, fps, slots, threads, root=None, store=None,
+                 projectDir=None):
+        self.ffCommand = ffCommand
+        self.root = root
+        self.store = store
+        self.ffprobe = ffprobeCommand(ffCommand)
+        self.fps = fps
+        self.slots = slots
+        self.threads = threads
+
+        self.v_resolutions = []
+        self.bl_sizes = []
+        self.projectDir = projectDir
+        if op.proxies and op.prop_proxy_layout != 'REVOLVER':
+            self.bl_sizes = sorted(int(size) for size in op.prop_bl_sizes)
+        elif op.proxies:
+            for rung in (proxy_rungs if op.prop_ladder else (100,)):
+                # Sizes stay even, as most codecs require
+                self.v_resolutions.append(("proxy", op.prop_proxy_w * rung // 200 * 2,
+                                           op.prop_proxy_h * rung // 200 * 2, rung))
+        if op.intermediates:
+            self.v_resolutions.append(("fullres", op.prop_fullres_w, op.prop_fullres_h, 100))
+
+        self.v_format = op.v_format
+        self.deint = op.prop_deint
+        self.ar = op.prop_ar
+        self.ac = op.prop_ac
+        self.ow = op.prop_ow
+        self.single_decode = op.prop_single_decode
+        self.ladder = op.proxies and (op.prop_ladder or len(self.bl_sizes) > 1)
+        self.audio = op.prop_audio
+        self.images = op.prop_images
+        self.image_width = op.prop_proxy_w
+        self.segment = op.prop_segment
+        self.segment_length = op.prop_segment_minutes * 60
+
+    def save(self):
+        '''Writes what build() added to the probe cache and the store index.
+        Rewriting them once per batch would cost more than the scan'''
+        getProbeCache().save()
+        if self.store:
+            self.store.save()
+
+    def build(self, sources):
+        # Images get JPEG proxies; every other source is a video
+        images = [source for source in sources
+                  if os.path.splitext(source)[1].lower() in bpy.path.extensions_image]
+        sources = [source for source in sources if source not in images]
+
+        # Probe sources in parallel; repeated runs read from the cache
+        metadata = getProbeCache().probe(self.ffprobe, sources, save=False)
+        # Sources removed since they were listed are left out
+        sources = [source for source in sources if source in metadata]
+        for source in sources:
+            if metadata[source]['vfr']:
+                print("'" + source + "' has variable frame rate; it will be "
+                      "levelled to %.2f fps." % self.fps)
+
+        jobs = []
+        for source in sources:
+            for v_res, v_res_w, v_res_h, rung in self.v_resolutions:
+                jobs.append(VideoSource(self.ffCommand, os.path.dirname(source) + os.sep,
+                                        source, v_res, v_res_w, v_res_h,
+                                        self.v_format, self.fps, self.deint,
+                                        self.ar, self.ac, self.ow, self.threads,
+                                        metadata[source], rung))
+            for size in self.bl_sizes:
+                job = BlenderProxy(self.ffCommand, os.path.dirname(source) + os.sep,
+                                   source, size, self.fps, self.ow, self.threads,
+                                   metadata[source], self.projectDir)
+                os.makedirs(os.path.dirname(job.v_output), exist_ok=True)
+                jobs.append(job)
+            # Sources without audio get no sidecar
+            if self.audio and metadata[source]['a_codec']:
+                jobs.append(AudioSidecar(self.ffCommand, os.path.dirname(source) + os.sep,
+                                         source, self.fps, self.ar, self.ac, self.ow,
+                                         self.threads, metadata[source]))
+
+        for image in images:
+            job = ImageProxy(self.ffCommand, image, self.image_width, self.ow, self.root)
+            os.makedirs(os.path.dirname(job.v_output), exist_ok=True)
+            jobs.append(job)
+
+        # Proxies go to the shared store, where copies of the same footage
+        # from other projects already have theirs, or to the local proxy
+        # folder, so that editing never reads them over the network
+        if self.store:
+            for job in jobs:
+                if job.v_res in ("proxy", "audio"):
+                    fingerprint = cachedFingerprint(job.input)
+                    self.store.register(fingerprint, job.input)
+                    if job.v_res == "audio":
+                        job.v_output = self.store.audioPath(fingerprint, job.profile())
+                    else:
+                        job.v_output = self.store.proxyPath(fingerprint, job.profile(),
+                                                            job.v_size, job.rung)
+                    os.makedirs(os.path.dirname(job.v_output), exist_ok=True)
+                    # Store files are named after the content and profile
+                    # they are made from, so one that exists is up to date.
+                    # Other projects may be playing it: it is never rewritten
+                    job.fingerprint = fingerprint
+                    job.overwrite = " -n"
+            jobs = [job for job in jobs
+                    if not (job.fingerprint and os.path.exists(job.v_output))]
+        elif self.root:
+            for job in jobs:
+                if job.v_res in ("proxy", "audio"):
+                    job.v_output = mirroredPath(self.root, job.v_output)
+                    os.makedirs(os.path.dirname(job.v_output), exist_ok=True)
+
+        # Without overwriting, outputs that are up to date are skipped
+        # before any FFMPEG starts; outputs from an older source or
+        # from other settings are encoded again
+        if not self.ow:
+            manifest = getManifest()
+            outdated = []
+            for job in jobs:
+                state = manifest.state(job)
+                if state == 'STALE':
+                    # A store file missing here was deleted, not outdated
+                    if not job.fingerprint:
+                        job.overwrite = " -y"
+                    outdated.append(job)
+                elif state == 'UNKNOWN' and not os.path.exists(job.v_output):
+                    outdated.append(job)
+            if len(outdated) < len(jobs):
+                print("Velvet Revolver: %i of %i outputs are up to date."
+                      % (len(jobs) - len(outdated), len(jobs)))
+            jobs = outdated
+
+        # Images are encoded a folder's worth at a time
+        imageJobs = batchImages([job for job in jobs if job.v_res == "image"])
+        jobs = [job for job in jobs if job.v_res != "image"]
+
+        # Outputs still to be made from the same source share one decode;
+        # rungs of the proxy ladder and WAV sidecars always go with proxies
+        if self.single_decode or self.ladder or self.audio:
+            bySource = {}
+            for job in jobs:
+                if self.single_decode:
+                    bySource.setdefault(job.input, []).append(job)
+                else:
+                    kind = "fullres" if job.v_res == "fullres" else "proxy"
+                    bySource.setdefault((job.input, kind), []).append(job)
+            jobs = [group[0] if len(group) == 1 else MultiOutputSource(group)
+                    for group in bySource.values()]
+
+        # A long video would keep one job busy long after the others
+        # finished; its keyframe-aligned chunks are encoded in parallel
+        if self.segment and self.slots > 1:
+            splitJobs = []
+            for job in jobs:
+                duration = job.meta.get('duration', 0.0)
+                cuts = []
+                if duration > self.segment_length:
+                    n = max(2, min(self.slots, int(duration // 60)))
+                    cuts = keyframeCuts(self.ffprobe, job.input, duration, n)
+                if len(cuts) > 1:
+                    print("'%s' will be encoded in %i chunks." % (job.input, len(cuts)))
+                    splitJobs += splitJob(job, cuts)
+                else:
+                    splitJobs.append(job)
+            jobs = splitJobs
+
+        return jobs + imageJobs
+
+
 class VelvetRevolver(bpy.types.Operator, ExportHelper):
     """Mass encode proxies and/or intra-frame intermediates from original files"""
     bl_idname = "export.revolver"
@@ -354,6 +3087,36 @@ class VelvetRevolver(bpy.types.Operator, ExportHelper):
         description="Proxy videos will have this height",
         default=360
     )
+    prop_proxy_layout: EnumProperty(
+        name="Layout",
+        default='REVOLVER',
+        description="Where proxies are written and how they are used",
+        items=(
+            ('REVOLVER', "Revolver", "_proxy.mov files, used by the proxy toggles"),
+            ('BL_STRIP', "Blender, Per Strip", "Blender's proxies in BL_proxy beside each video, "
+                                               "used through the preview's proxy size"),
+            ('BL_PROJECT', "Blender, Per Project", "Blender's proxies in the scene's proxy directory, "
+                                                   "used through the preview's proxy size"),
+        )
+    )
+    prop_bl_sizes: EnumProperty(
+        name="Sizes",
+        options={'ENUM_FLAG'},
+        default={'50'},
+        description="Blender proxy sizes to write, in percent of each video",
+        items=(
+            ('25', "25%", ""),
+            ('50', "50%", ""),
+            ('75', "75%", ""),
+            ('100', "100%", ""),
+        )
+    )
+    prop_ladder: BoolProperty(
+        name="Proxy Ladder",
+        description="Also encode proxies at 50% and 25% of this size, from the same "
+                    "decode, to switch to when playback is slow",
+        default=False,
+    )
     intermediates: BoolProperty(
         name="Encode Intermediates",
         description="Encode intermediates with same FPS as current scene (slow)",
@@ -369,12 +3132,62 @@ class VelvetRevolver(bpy.types.Operator, ExportHelper):
         description="Intermediate videos will have this height",
         default=1080
     )
+    prop_scope: EnumProperty(
+        name="Sources",
+        default='FOLDER',
+        description="Which videos to transcode",
+        items=(
+            ('FOLDER', "Folder", "Videos in the chosen folder"),
+            ('ALL', "All Strips", "Source videos of every strip in the scene"),
+            ('SELECTED', "Selected Strips", "Source videos of the selected strips"),
+            ('PREVIEW', "Preview Range", "Source videos of the strips inside the preview range"),
+            ('CHANNELS', "Channels", "Source videos of the strips in the listed channels"),
+        )
+    )
+    prop_channels: StringProperty(
+        name="Channels",
+        description="Channels whose videos are transcoded, as in 1, 3-5",
+        default="",
+    )
+    prop_recursive: BoolProperty(
+        name="Include Subfolders",
+        description="Also encode videos inside subfolders, ie. camera cards' DCIM/100CANON",
+        default=True,
+    )
+    prop_depth: IntProperty(
+        name="Depth",
+        description="How many folder levels to scan (0 = no limit, 1 = only the chosen folder)",
+        default=0,
+        min=0,
+    )
+    prop_include: StringProperty(
+        name="Include",
+        description="Only encode files matching these patterns, ie. '*.MTS, *.MP4' (empty = all videos)",
+        default="",
+    )
+    prop_exclude: StringProperty(
+        name="Exclude",
+        description="Skip files and folders matching these patterns, ie. 'THMBNL, *_old*'",
+        default="",
+    )
     v_format: EnumProperty(
         name="Codec",
         default="is_mjpeg",
         description="Intra-frame format for the creation of proxies and/or intermediates",
         items=transcode_items
     )
+    prop_images: BoolProperty(
+        name="Image Proxies",
+        description="Also make JPEG proxies, as wide as proxy videos, of stills and "
+                    "image sequences (ie. EXR, DPX, TIFF) for image strips",
+        default=False,
+    )
+    prop_audio: BoolProperty(
+        name="WAV Sidecars",
+        description="Also write the audio of each video to a WAV file, for sound "
+                    "strips to play instead of the movie's compressed audio",
+        default=False,
+    )
     prop_ar: IntProperty(
         name="Audio Sample Rate",
         description="Transcoded videos will have this audio rate",
@@ -395,6 +3208,38 @@ class VelvetRevolver(bpy.types.Operator, ExportHelper):
         description="Allow FFMPEG to overwrite existing files",
         default=False,
     )
+    prop_single_decode: BoolProperty(
+        name="Single Decode",
+        description="When encoding proxies and intermediates, decode each video once and write both files from it",
+        default=True,
+    )
+    prop_segment: BoolProperty(
+        name="Split Long Videos",
+        description="Encode long videos in parallel chunks, joined losslessly afterwards",
+        default=True,
+    )
+    prop_segment_minutes: IntProperty(
+        name="Longer Than (min)",
+        description="Videos longer than this are split in chunks",
+        default=30,
+        min=2,
+    )
+    prop_order: EnumProperty(
+        name="Order",
+        default="SHORTEST",
+        description="Which videos to encode first. Videos already in the open scene always go first",
+        items=(
+            ('SHORTEST', 'Shortest First', 'Usable proxies for most videos as early as possible'),
+            ('LONGEST', 'Longest First', 'Shortest total time when running parallel jobs'),
+            ('NAME', 'By Name', 'Alphabetical order'),
+        )
+    )
+    prop_jobs: IntProperty(
+        name="Parallel Jobs",
+        description="How many FFMPEGs to run at the same time (0 = automatic, based on CPU cores)",
+        default=0,
+        min=0,
+    )
 
     def draw(self, context):
 
@@ -412,8 +3257,13 @@ class VelvetRevolver(bpy.types.Operator, ExportHelper):
         box.use_property_split = True
         col = box.column(align=True)
         col.active = self.proxies
-        col.prop(self, 'prop_proxy_w')
-        col.prop(self, 'prop_proxy_h')
+        col.prop(self, 'prop_proxy_layout')
+        if self.prop_proxy_layout == 'REVOLVER':
+            col.prop(self, 'prop_proxy_w')
+            col.prop(self, 'prop_proxy_h')
+            col.prop(self, 'prop_ladder')
+        else:
+            col.row().prop(self, 'prop_bl_sizes')
 
         box = layout.box()
         box.use_property_split = False
@@ -424,12 +3274,37 @@ class VelvetRevolver(bpy.types.Operator, ExportHelper):
         col.prop(self, 'prop_fullres_w')
         col.prop(self, 'prop_fullres_h')
 
+        box = layout.box()
+        box.prop(self, 'prop_scope')
+        row = box.row()
+        row.active = self.prop_scope == 'CHANNELS'
+        row.prop(self, 'prop_channels')
+        col = box.column()
+        col.active = self.prop_scope == 'FOLDER'
+        col.prop(self, 'prop_recursive')
+        sub = col.column(align=True)
+        sub.active = self.prop_recursive
+        sub.prop(self, 'prop_depth')
+        col.prop(self, 'prop_include')
+        col.prop(self, 'prop_exclude')
+
         box = layout.box()
         box.prop(self, 'v_format')
+        box.prop(self, 'prop_images')
+        box.prop(self, 'prop_audio')
         box.prop(self, 'prop_ar')
         box.prop(self, 'prop_deint')
         box.prop(self, 'prop_ac')
         box.prop(self, 'prop_ow')
+        row = box.row()
+        row.active = self.proxies and self.intermediates
+        row.prop(self, 'prop_single_decode')
+        box.prop(self, 'prop_segment')
+        row = box.row()
+        row.active = self.prop_segment
+        row.prop(self, 'prop_segment_minutes')
+        box.prop(self, 'prop_order')
+        box.prop(self, 'prop_jobs')
 
         col = box.column(align=True)
         col.alignment = 'RIGHT'
@@ -442,94 +3317,177 @@ class VelvetRevolver(bpy.types.Operator, ExportHelper):
             return bpy.data.scenes is not None
 
     def execute(self, context):
-        ffCommand = bpy.context.preferences.addons['velvet_revolver'].preferences.ffCommand
+        preferences = bpy.context.preferences.addons['velvet_revolver'].preferences
+        ffCommand = preferences.ffCommand
 
         videosFolderPath, blenderFile = os.path.split(self.filepath)
-        videosFolderPath += os.sep
 
         #fps = context.scene.render.fps
         render = context.scene.render
         fps = round(render.fps / render.fps_base, 2)
 
-        sources = []
-
-        for i in glob.glob(videosFolderPath + "*.*"):
-            if i[-4:].lower() in bpy.path.extensions_movie:
-                # The line below does not allow for the creation of proxies from
-                # a _PRORES or _MJPEG file. TO-DO: creation of sources = [] has
-                # to be inside self.proxies and self.intermediates. Then, the script
-                # should check for a "original" file (ie. without _prores) ->
-                # if it finds it, pass; else, execute ffmpeg command.
-                # Also: 'sources' should be sorted by filesize, so that
-                # smaller files are transcoded first (create this as an option:
-                # sort by filesize, sort by name).
-                if "_proxy." not in i and "_MJPEG." not in i \
-                   and "_PRORES." not in i and "_h264" not in i:
-                    sources.append(i)
-
         # If nothing is selected to do, abort. Else, continue
         if not self.proxies and not self.intermediates:
             print("No action selected for Velvet Revolver. Aborting.")
 
         else:
-            # Encode a percentage to base a (mouse) progress counter
-            wm = bpy.context.window_manager
-
-            if self.proxies and self.intermediates:
-                # If Revolver has to encode both proxies and intermediates,
-                # there are 2x as many levels to be considered
-                inc_level = int(100 / (2 * len(sources)))
+            # Proxies and intermediates share the same pool, so both kinds
+            # of job run at the same time
+            n_jobs, threads = autoJobs(self.prop_jobs, os.cpu_count() or 1)
+            print("Velvet Revolver: %i jobs at a time with %i threads each."
+                  % (n_jobs, threads))
+
+            # Sources already edited in the open scene (as themselves or
+            # as their proxies or intermediates) are needed first
+            priority = set()
+            if context.scene.sequence_editor:
+                for s in context.scene.sequence_editor.sequences_all:
+                    if s.type == "MOVIE":
+                        priority.add(sourceBase(bpy.path.abspath(s.filepath)))
+                    elif s.type == "SOUND":
+                        priority.add(sourceBase(bpy.path.abspath(s.sound.filepath)))
+
+            limits = DeviceLimits(preferences.ioJobs, preferences.ioLimits)
+
+            self._pool = RevolverPool([], n_jobs, jobOrder(self.prop_order, priority),
+                                      limits)
+
+            # Sources stream into the pool while the folder is scanned
+            if self.prop_scope == 'FOLDER':
+                sources = scanSources(videosFolderPath, self.prop_recursive,
+                                      self.prop_depth, self.prop_include,
+                                      self.prop_exclude, self.prop_images)
             else:
-                inc_level = int(100 / len(sources))
+                sources = self.stripSources(context.scene)
+            # Per-project Blender proxies go to the scene's proxy directory
+            projectDir = None
+            if self.proxies and self.prop_proxy_layout == 'BL_PROJECT':
+                ed = context.scene.sequence_editor
+                projectDir = bpy.path.abspath((ed.proxy_dir if ed else "") or "//BL_proxy")
+                if not os.path.isabs(projectDir):
+                    self.report({'ERROR'}, "Save the .blend file first, its proxy "
+                                           "directory is relative to it.")
+                    return {'CANCELLED'}
+            if self.proxies and self.prop_proxy_layout != 'REVOLVER' and not self.prop_bl_sizes:
+                self.report({'ERROR'}, "No Blender proxy size selected.")
+                return {'CANCELLED'}
+
+            builder = JobBuilder(self, ffCommand, fps, n_jobs, threads,
+                                 getProxyRoot(), getProxyStore(), projectDir)
+            self._scanner = SourceScanner(sources, builder)
+            self._scanner.start()
+
+            # Encoding runs in the background; a timer wakes the modal
+            # handler to collect progress while the editor stays usable
+            wm = context.window_manager
+            wm.progress_begin(0, 100)
+            self._timer = wm.event_timer_add(0.5, window=context.window)
+            wm.modal_handler_add(self)
+
+            return {'RUNNING_MODAL'}
 
-            wm.progress_begin(1, 100)
-            percentage_level = 1
-            wm.progress_update(percentage_level)
-
-            cnt = 0
+        return {'FINISHED'}
 
-            if self.proxies:
-                for source in sources:
-                    v_res = "proxy"
-                    vs = VideoSource(ffCommand, videosFolderPath, source, v_res,
-                                     self.prop_proxy_w, self.prop_proxy_h,
-                                     self.v_format, fps, self.prop_deint,
-                                     self.prop_ar, self.prop_ac, self.prop_ow)
+    def stripSources(self, scene):
+        '''Returns the source videos (and images, with Image Proxies) of
+        the strips in scope, once each'''
+        index = getMediaIndex()
+        sources = []
+        seen = set()
+        for s in scopedStrips(scene, self.prop_scope, self.prop_channels):
+            if s.type == "IMAGE" and self.prop_images:
+                folder = imageStripFolder(s)
+                names = [e.filename for e in s.elements]
+                # Strips on proxies are made from the images they replace
+                if imageSourceFolder(folder, index.root):
+                    folder = imageSourceFolder(folder, index.root)
+                    names = [os.path.splitext(name)[0] for name in names]
+                found = [os.path.join(folder, name) for name in names]
+            elif s.type == "MOVIE":
+                source = index.sourceFor(stripFilepath(s))
+                if source is None:
+                    print("No source video found for '" + stripFilepath(s) + "'.")
+                found = [source] if source else []
+            else:
+                continue
+            for source in found:
+                if source not in seen:
+                    seen.add(source)
+                    sources.append(source)
+        return sources
+
+    def modal(self, context, event):
+        pool = self._pool
+
+        if event.type == 'ESC':
+            self._scanner.stop()
+            pool.cancel()
+            self.finish(context)
+            self.report({'WARNING'}, "Velvet Revolver cancelled.")
+            return {'CANCELLED'}
+
+        if event.type == 'TIMER':
+            scanning = self._scanner.is_alive()
+            pool.add(self._scanner.take())
+
+            if self._scanner.error is not None:
+                pool.cancel()
+                self.finish(context)
+                self.report({'ERROR'}, "Velvet Revolver stopped: " + str(self._scanner.error))
+                return {'CANCELLED'}
+
+            if pool.poll() or scanning:
+                status = pool.status()
+                if scanning:
+                    status += " | Scanning: %i videos found" % self._scanner.found
+                # Update window_manager progress counter
+                context.window_manager.progress_update(pool.progress())
+                context.workspace.status_text_set(status)
+            else:
+                self.finish(context)
 
-                    # Update window_manager progress counter
-                    wm.progress_update(percentage_level)
-                    percentage_level += inc_level
+                for job in pool.done:
+                    for out in job.outputs():
+                        if out.v_res == "proxy":
+                            self.report({'INFO'}, "Finished encoding: "+out.input+" as proxy")
 
-                    if vs.runFF() == {'CANCELED'}:
-                        cnt += 1
-                    else:
-                        self.report({'INFO'}, "Finished encoding: "+source+" as proxy")
+                if pool.failed:
+                    print("Some files where not encoded. Look above for more info.")
+                    # self.report({'ERROR'}, "Some files where not encoded. Look in the System Console for more info.")
+                else:
+                    self.report({'INFO'}, "Velvet Revolver finished encoding files.")
 
-            if self.intermediates:
-                for source in sources:
-                    v_res = "fullres"
-                    vs = VideoSource(ffCommand, videosFolderPath, source, v_res,
-                                     self.prop_fullres_w, self.prop_fullres_h,
-                                     self.v_format, fps, self.prop_deint,
-                                     self.prop_ar, self.prop_ac, self.prop_ow)
+                return {'FINISHED'}
 
-                    # Update window_manager progress counter
-                    wm.progress_update(percentage_level)
-                    percentage_level += inc_level
+        return {'PASS_THROUGH'}
 
-                    if vs.runFF() == {'CANCELED'}:
-                        cnt += 1
+    def finish(self, context):
+        manifest = getManifest()
+        made = {}
+        for job in self._pool.done:
+            for out in job.outputs():
+                manifest.record(out)
+                if out.v_res == "blender":
+                    made.setdefault(out.input, set()).add(out.size)
+        manifest.save()
 
-            # Finish report on progress counter
-            wm.progress_end()
+        # Strips of videos that got Blender proxies use them right away
+        if made:
+            if self.prop_proxy_layout == 'BL_PROJECT' and context.scene.sequence_editor:
+                context.scene.sequence_editor.proxy_storage = 'PROJECT'
+            enableBlenderProxies(context.scene, made)
 
-            if cnt != 0:
-                print("Some files where not encoded. Look above for more info.")
-                # self.report({'ERROR'}, "Some files where not encoded. Look in the System Console for more info.")
-            else:
-                self.report({'INFO'}, "Velvet Revolver finished encoding files.")
+        wm = context.window_manager
+        wm.event_timer_remove(self._timer)
+        # Finish report on progress counter
+        wm.progress_end()
+        context.workspace.status_text_set(None)
 
-        return {'FINISHED'}
+    def cancel(self, context):
+        # Called when Blender itself ends the operator (ie. file loading)
+        self._scanner.stop()
+        self._pool.cancel()
+        self.finish(context)
 
 
 class Velvet_Revolver_Transcoder(bpy.types.AddonPreferences):
@@ -548,6 +3506,57 @@ class Velvet_Revolver_Transcoder(bpy.types.AddonPreferences):
         subtype='FILE_PATH',
         default=ffmpeg,
     )
+    proxyRoot: StringProperty(
+        name="Local Proxy Folder",
+        description="Fast local folder where proxies are written, mirroring their sources' "
+                    "paths, ie. on an NVMe disk when footage is on a NAS (empty = beside sources)",
+        subtype='DIR_PATH',
+        default="",
+    )
+    proxyStore: StringProperty(
+        name="Shared Proxy Store",
+        description="Folder where proxies of all projects are kept and reused, "
+                    "found by the content of their sources (empty = proxies beside sources)",
+        subtype='DIR_PATH',
+        default="",
+    )
+    rememberFolders: BoolProperty(
+        name="Remember Folder Listings",
+        description="Keep folder listings between proxy toggles, until files are added "
+                    "or removed in them. Turn off if your network share does not update folder dates",
+        default=True,
+    )
+    cacheSize: FloatProperty(
+        name="Output Cache Size (GB)",
+        description="Proxies and intermediates above this total size are deleted, "
+                    "least recently used first, by 'Trim Revolver Outputs' (0 = no limit)",
+        default=0.0,
+        min=0.0,
+    )
+    ioJobs: IntProperty(
+        name="Reads per Device",
+        description="How many FFMPEGs may read from the same disk at once "
+                    "(0 = automatic: 2 on spinning disks, no limit on others)",
+        default=0,
+        min=0,
+    )
+    ioLimits: StringProperty(
+        name="Per-Mount Limits",
+        description="Reads allowed on specific mounts, ie. '/mnt/raid=1, /media/nvme=8'",
+        default="",
+    )
+    playbackGovernor: BoolProperty(
+        name="Playback Governor",
+        description="While playback drops frames, switch strips under the playhead to "
+                    "smaller proxies (or lower the preview's proxy size), and back when it stops",
+        default=False,
+    )
+    renderFullRes: BoolProperty(
+        name="Render at Full Resolution",
+        description="Swap proxy strips to their full-res files while rendering, "
+                    "and back to proxies when the render ends",
+        default=True,
+    )
 
     def draw(self, context):
 
@@ -556,10 +3565,38 @@ class Velvet_Revolver_Transcoder(bpy.types.AddonPreferences):
                           "change it, do so with no .blend files open or "
                           "they will be relative.")
         layout.prop(self, "ffCommand")
+        layout.prop(self, "proxyRoot")
+        layout.prop(self, "proxyStore")
+        layout.prop(self, "rememberFolders")
+        layout.prop(self, "cacheSize")
+        layout.prop(self, "ioJobs")
+        layout.prop(self, "ioLimits")
+        layout.prop(self, "renderFullRes")
+        layout.prop(self, "playbackGovernor")
+
+
+class Revolver_Trim_Outputs(bpy.types.Operator):
+    """Delete least recently used proxies and intermediates above the size set in Velvet Revolver's preferences"""
+    bl_idname = "sequencer.revolver_trim"
+    bl_label = "Trim Revolver Outputs"
+
+    def execute(self, context):
+        preferences = bpy.context.preferences.addons['velvet_revolver'].preferences
+        if not preferences.cacheSize:
+            self.report({'WARNING'}, "No Output Cache Size set in Velvet Revolver's preferences.")
+            return {'CANCELLED'}
+
+        # Anything used by the open .blend stays
+        deleted, freed = trimOutputs(int(preferences.cacheSize * 1024 ** 3),
+                                     referencedPaths())
+        self.report({'INFO'}, "Deleted %i files, freed %.2f GB." % (deleted, freed / 1024 ** 3))
+
+        return {'FINISHED'}
 
 
 def menuEntry(self, context):
     self.layout.operator(VelvetRevolver.bl_idname, text="Velvet Revolver")
+    self.layout.operator(Revolver_Trim_Outputs.bl_idname)
 
 
 class SEQUENCER_OT_proxy_swap(bpy.types.Operator):
@@ -578,7 +3615,21 @@ class SEQUENCER_OT_proxy_swap(bpy.types.Operator):
              ),
              default={'INTERMEDIATES'},
         )
-
+    prop_rung: EnumProperty(
+        name="Proxy Size",
+        default='100',
+        items=rung_items,
+    )
+    prop_scope: EnumProperty(
+        name="Strips",
+        default='ALL',
+        items=toggle_scopes,
+    )
+    prop_channels: StringProperty(
+        name="Channels",
+        description="Channels to swap, as in 1, 3-5",
+        default="",
+    )
 
     @classmethod
     def poll(cls, context):
@@ -589,52 +3640,42 @@ class SEQUENCER_OT_proxy_swap(bpy.types.Operator):
 
     def execute(self, context):
         if self.type == {'PROXY'}:
-            bpy.ops.sequencer.proxy_editing_toproxy()
+            bpy.ops.sequencer.proxy_editing_toproxy(prop_rung=self.prop_rung,
+                                                    prop_scope=self.prop_scope,
+                                                    prop_channels=self.prop_channels)
         else:
-            bpy.ops.sequencer.proxy_editing_tofullres()
+            bpy.ops.sequencer.proxy_editing_tofullres(prop_scope=self.prop_scope,
+                                                      prop_channels=self.prop_channels)
 
         scene = bpy.context.scene
         for s in scene.sequence_editor.sequences_all:
             if (s.type == "MOVIE"):
-                strip = s
-
-                # hack: update in viewport to read source img orig_width and orig_height
-                # switch view and area
-                oldf = scene.frame_current
-                area = bpy.context.area
-                original_type = area.type
-                area.type = 'SEQUENCE_EDITOR'
-                original_view = area.spaces[0].view_type
-                area.spaces[0].view_type = 'PREVIEW'
-                # NOTE playhead steps alone are sufficient when user has visible VSE Preview
-                frame_initial = scene.frame_current
-                scene.frame_current = strip.frame_start
-                bpy.ops.render.opengl(sequencer=True)
-
-                # gather image data
-                img = strip.elements[0]
-                # store dimensions
-
-                if not (img.orig_width and img.orig_height):
-                    print("pretty_img - Failed to rescale img with width or height of 0: {0}".format(img.filename))
-                    return
-
-                img_res = {
-                    'w': img.orig_width,
-                    'h': img.orig_height
-                }
-                print("%s: %s" % (img.filename, "{0} x {1}".format(img_res['w'], img_res['h'])))
-                bpy.context.scene.render.resolution_x = img_res['w']
-                bpy.context.scene.render.resolution_y = img_res['h']
-
-                bpy.ops.sequencer.view_all_preview() # doesn't work
-
-                # reset view and area
-                area.spaces[0].view_type = original_view
-                area.type = original_type
-                # /hack
-
-                scene.frame_current = oldf
+                f_path = stripFilepath(s)
+
+                # Resolution of the swapped file comes from the probe cache,
+                # so no frame has to be rendered to know it. A file not in
+                # the cache yet is probed right away
+                width = height = 0
+                if os.path.isfile(f_path):
+                    preferences = bpy.context.preferences.addons['velvet_revolver'].preferences
+                    meta = getProbeCache().probe(ffprobeCommand(preferences.ffCommand),
+                                                 [f_path]).get(f_path)
+                    if meta:
+                        width, height = meta['width'], meta['height']
+
+                # Offline files and files ffprobe cannot read: what Blender
+                # read when loading the strip
+                if not (width and height):
+                    img = s.elements[0]
+                    width, height = img.orig_width, img.orig_height
+
+                if not (width and height):
+                    print("Proxy Swap - Could not read the resolution of {0}".format(f_path))
+                    break
+
+                print("%s: %s" % (os.path.basename(f_path), "{0} x {1}".format(width, height)))
+                scene.render.resolution_x = width
+                scene.render.resolution_y = height
                 break
 
         return {'FINISHED'}
@@ -653,6 +3694,10 @@ classes = (
 #    VideoSource,
     VelvetRevolver,
     Velvet_Revolver_Transcoder,
+    Revolver_Trim_Outputs,
+    Revolver_Bake_Scenes,
+    Revolver_Freeze_Strips,
+    Revolver_Revert_Bakes,
     SEQUENCER_OT_proxy_swap,
 )
 
@@ -678,6 +3723,22 @@ def register():
     kmi = km.keymap_items.new(Proxy_Editing_ToProxy.bl_idname, 'P', 'PRESS', shift=True, ctrl=True, alt=True)
     revolver_keymaps.append((km, kmi))
 
+    # Swap proxies to full-res for renders
+    bpy.app.handlers.render_init.append(swapToFullRes)
+    bpy.app.handlers.render_complete.append(restoreProxies)
+    bpy.app.handlers.render_cancel.append(restoreProxies)
+
+    # Playback governor, toggled in its preference or the Proxy Settings panel
+    bpy.app.handlers.frame_change_post.append(governorFrame)
+    bpy.app.timers.register(governorTick, persistent=True)
+    bpy.types.SEQUENCER_PT_proxy_settings.append(governorEntry)
+
+    # Baked strips follow the changes of their sources
+    bpy.app.handlers.depsgraph_update_post.append(bakesChanged)
+    bpy.app.handlers.load_post.append(bakesChanged)
+    bpy.app.timers.register(checkBakes, persistent=True)
+    bpy.types.SEQUENCER_MT_strip.append(bakeEntry)
+
 
 def unregister():
     for cls in reversed(classes):
@@ -693,6 +3754,26 @@ def unregister():
         km.keymap_items.remove(kmi)
     revolver_keymaps.clear()
 
+    bpy.app.handlers.render_init.remove(swapToFullRes)
+    bpy.app.handlers.render_complete.remove(restoreProxies)
+    bpy.app.handlers.render_cancel.remove(restoreProxies)
+
+    bpy.app.handlers.frame_change_post.remove(governorFrame)
+    if bpy.app.timers.is_registered(governorTick):
+        bpy.app.timers.unregister(governorTick)
+    playback_governor.restore()
+    bpy.types.SEQUENCER_PT_proxy_settings.remove(governorEntry)
+
+    bpy.app.handlers.depsgraph_update_post.remove(bakesChanged)
+    bpy.app.handlers.load_post.remove(bakesChanged)
+    if bpy.app.timers.is_registered(checkBakes):
+        bpy.app.timers.unregister(checkBakes)
+    bpy.types.SEQUENCER_MT_strip.remove(bakeEntry)
+
 
 if __name__ == "__main__":
-    register()
+    argv = sys.argv[sys.argv.index("--") + 1:] if "--" in sys.argv else []
+    if "--trim" in argv:
+        trimCommand(argv)
+    else:
+        register()